@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -12,11 +11,13 @@ modules yourself. Start by modifying the 'on_turn' function.
 
 Advanced strategy tips: 
 
-  - You can analyze action frames by modifying on_action_frame function
+  - You can analyze action frames by modifying on_action_frame function,
+  or get just the events you need with self.subscribe, like on_breach
 
   - The GameState.map object can be manually manipulated to create hypothetical 
   board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  the actual current map state. game_state.fork() makes a cheap copy of the
+  whole game state for this.
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
@@ -31,7 +32,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Read in config and perform any initial setup here 
         """
         gamelib.debug_write('Configuring your custom algo strategy...')
-        self.config = config
+        super().on_game_start(config)
         global WALL, FACTORY, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, MP, SP
         WALL = config["unitInformation"][0]["shorthand"]
         FACTORY = config["unitInformation"][1]["shorthand"]
@@ -43,6 +44,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         SP = 0
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # Only breach events are decoded from the action frames, see on_breach
+        self.subscribe("breach", self.on_breach)
 
     def on_turn(self, turn_state):
         """
@@ -53,6 +56,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         game engine.
         """
         game_state = gamelib.GameState(self.config, turn_state)
+        # Reuses what was precomputed during the last action phase, if background_precompute is set in __init__
+        self.warm_start(game_state)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
@@ -197,11 +202,12 @@ class AlgoStrategy(gamelib.AlgoCore):
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
         total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
+        for structure_type in [WALL, FACTORY, TURRET]:
+            if unit_type is not None and structure_type != unit_type:
+                continue
+            for location in game_state.game_map.get_unit_locations(structure_type, 1):
+                if (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
+                    total_units += 1
         return total_units
         
     def filter_blocked_locations(self, locations, game_state):
@@ -211,17 +217,14 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_breach(self, breaches):
         """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
+        This is called with the breach events of each action frame that has some. Action frames
+        come hundreds of times per turn and could slow the algo down so avoid putting slow code here.
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at: https://docs.c1games.com/json-docs.html
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
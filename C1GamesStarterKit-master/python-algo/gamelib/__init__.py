@@ -13,6 +13,9 @@ Investigating it is useful for any player that wants to access information about
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
+The ThreatMap class in threat_map.py holds the damage per frame mobile units would take at every location, get it with game_map.get_threat_map(). 
+It is kept up to date as structures are added, removed or upgraded, which makes it cheap to check spawn locations and paths for safety. \n
+
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
@@ -20,10 +23,14 @@ util.py contains a small handful of functions that help with communication, incl
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, parse_json
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .threat_map import ThreatMap
+from .unit_catalog import UnitCatalog
+from .unit_table import UnitTable
+from .scheduler import TurnScheduler
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "game_state", "game_map", "navigation", "scheduler", "threat_map", "unit", "unit_catalog", "unit_table", "util"]
  
\ No newline at end of file
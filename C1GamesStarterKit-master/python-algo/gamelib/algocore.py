@@ -1,7 +1,9 @@
-import json
-
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .precompute import PrecomputeWorker
+from .unit_catalog import UnitCatalog
+from .util import CommandReader, debug_write, encode_json, parse_json, parse_json_field, BANNER_TEXT, send_command
+
+EVENT_TYPES = ("selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee")
 
 class AlgoCore(object):
     """
@@ -10,23 +12,38 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * unit_catalog (:obj: UnitCatalog): the unit types of the config, compiled once at the start of the game
+        * coalesce_action_frames (bool): if action frames arrive faster than they are handled, handle the waiting ones as one frame
+        * frames_received (int): the number of action frames received from the engine
+        * frames_coalesced (int): the number of action frames that were merged into a later one instead of being handled on their own
+        * background_precompute (bool): if True, run precompute on the latest board in a background thread during the action phase
+        * precompute_worker (:obj: PrecomputeWorker): the background worker, started with the first action frame if background_precompute is set
 
     """
     def __init__(self):
         self.config = None
+        self.unit_catalog = None
+        self.coalesce_action_frames = True
+        self.frames_received = 0
+        self.frames_coalesced = 0
+        self.background_precompute = False
+        self.precompute_worker = None
+        self.__subscriptions = {}
 
     def on_game_start(self, config):
         """
         This function is called once at the start of the game. 
-        By default, it just initializes the config. \n
+        By default, it just initializes the config and compiles it into a UnitCatalog. \n
         You can override it it in algo_strategy.py to perform start of game setup
         """
         self.config = config
+        self.unit_catalog = UnitCatalog.for_config(config)
 
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        GameState decodes it with parse_json, so any other code using parse_json on it shares that decode.
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -40,9 +57,108 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        If you only need some of the events, use subscribe instead: frames are then only partly decoded,
+        and frames nobody listens to are not decoded at all.
         """
         pass
 
+    def precompute(self, game_state):
+        """
+        If background_precompute is set, this is called in a background thread during the action phase, with a
+        GameState of the latest frame. By default it computes the distance fields to every edge and the threat map.
+        You can override it to prepare anything else for the next turn, like candidate build plans, and return it.
+        It should not change anything the rest of the algo uses, and should take a few milliseconds at most:
+        the next turn waits for it to finish.
+        """
+        game_map = game_state.game_map
+        game_state.get_distance_fields([game_map.TOP_RIGHT, game_map.TOP_LEFT, game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT])
+        game_map.get_threat_map()
+
+    def warm_start(self, game_state):
+        """
+        Call this at the start of on_turn to reuse what precompute prepared during the last action phase.
+        The game state takes over the distance fields and threat map of the last precomputed board, and
+        only updates them for the structures that changed since, see GameState.warm_start.
+
+        Returns:
+            What precompute returned for that board, or None if nothing was precomputed
+        """
+        if self.precompute_worker is None:
+            return None
+        board, value = self.precompute_worker.pause()
+        if board is None:
+            return None
+        game_state.warm_start(board)
+        return value
+
+    def subscribe(self, event_type, handler):
+        """Calls handler with the list of events of a type for every action frame that has some.
+
+        For example subscribe("breach", self.on_breach) in on_game_start calls self.on_breach(breaches)
+        whenever units score. Only the events of the frame are decoded, not the units.
+
+        Args:
+            event_type: One of selfDestruct, breach, damage, shield, move, spawn, death, attack or melee
+            handler: A function taking the list of events, in the engine's format
+
+        """
+        if event_type not in EVENT_TYPES:
+            debug_write("Subscribed to unknown event type {}, expected one of {}".format(event_type, EVENT_TYPES))
+        self.__subscriptions.setdefault(event_type, []).append(handler)
+
+    def unsubscribe(self, event_type, handler):
+        """Stops calling a handler passed to subscribe
+        """
+        handlers = self.__subscriptions.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self.__subscriptions.pop(event_type, None)
+
+    def _coalesce_action_frames(self, reader, game_state_string):
+        """
+        Merges the action frames already waiting in reader into game_state_string, if there are any.
+        The merged frame is the latest one, with the events of every merged frame in order, and is returned
+        decoded as a dict, which is only encoded again if on_action_frame needs the string. Only action frames
+        are merged, so the start of a turn and the end of the game are always handled on their own.
+        """
+        reader.poll()
+        frames = [game_state_string]
+        while reader.peek() is not None and "turnInfo" in reader.peek() and int(parse_json_field(reader.peek(), "turnInfo")[0]) == 1:
+            frames.append(reader.get_command())
+        self.frames_received += len(frames) - 1
+        if len(frames) == 1:
+            return game_state_string
+        self.frames_coalesced += len(frames) - 1
+
+        events = {}
+        for frame in frames:
+            for event_type, event_list in (parse_json_field(frame, "events") or {}).items():
+                events.setdefault(event_type, []).extend(event_list)
+        state = dict(parse_json(frames[-1]))
+        state["events"] = events
+        return state
+
+    def _dispatch_action_frame(self, game_state_string):
+        """
+        Hands an action frame to on_action_frame if a subclass overrides it, and its events to the subscribers.
+        The frame is a string from the engine, or a dict merged by _coalesce_action_frames.
+        """
+        decoded = isinstance(game_state_string, dict)
+        if type(self).on_action_frame is not AlgoCore.on_action_frame:
+            self.on_action_frame(encode_json(game_state_string) if decoded else game_state_string)
+        if not self.__subscriptions:
+            return
+        if decoded:
+            events = game_state_string.get("events") or {}
+        else:
+            events = parse_json_field(game_state_string, "events") or {}
+        for event_type, handlers in list(self.__subscriptions.items()):
+            event_list = events.get(event_type)
+            if event_list:
+                for handler in list(handlers):
+                    handler(event_list)
+
 
     def start(self):
         """ 
@@ -52,36 +168,49 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        reader = CommandReader()
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
+            game_state_string = reader.get_command()
             if "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = parse_json(game_state_string)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+                # Only turnInfo is decoded here, on_turn and action frame handlers decode what they need
+                stateType = int(parse_json_field(game_state_string, "turnInfo")[0])
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
+                    if self.precompute_worker is not None:
+                        self.precompute_worker.pause()
                     self.on_turn(game_state_string)
                 elif stateType == 1:
                     """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
+                    If stateType == 1, this game_state_string string represents a single frame of an action phase.
+                    If more frames are already waiting, we are falling behind, so they are handled together.
                     """
-                    self.on_action_frame(game_state_string)
+                    self.frames_received += 1
+                    if self.coalesce_action_frames:
+                        game_state_string = self._coalesce_action_frames(reader, game_state_string)
+                    self._dispatch_action_frame(game_state_string)
+                    if self.background_precompute:
+                        if self.precompute_worker is None:
+                            self.precompute_worker = PrecomputeWorker(self.config, self.precompute)
+                        self.precompute_worker.submit(game_state_string)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.precompute_worker is not None:
+                        self.precompute_worker.stop()
                     break
                 else:
                     """
@@ -1,7 +1,110 @@
+import copy
 import math
+from array import array
+from functools import lru_cache
 from .unit import GameUnit
+from .threat_map import ThreatMap
+from .unit_catalog import UnitCatalog
 from .util import debug_write
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_ARENA_TABLES = {}
+
+def arena_tables(arena_size=28):
+    """Gets the lookup tables for the diamond shaped board of the given size.
+    They are built on first use and shared by every GameMap and ShortestPathFinder afterwards.
+
+    Args:
+        arena_size: The size of the arena
+
+    Returns:
+        The ArenaTables for that size
+
+    """
+    tables = _ARENA_TABLES.get(arena_size)
+    if tables is None:
+        tables = _ARENA_TABLES[arena_size] = ArenaTables(arena_size)
+    return tables
+
+
+@lru_cache(maxsize=64)
+def _range_stencil(radius, get_hit_radius):
+    """Gets the (dx, dy) offsets of every location within radius + get_hit_radius of a location,
+    in the order get_locations_in_range has always returned them.
+    """
+    search_radius = math.ceil(radius)
+    limit = radius + get_hit_radius
+    return tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+        if math.sqrt(dx ** 2 + dy ** 2) < limit)
+
+@lru_cache(maxsize=4096)
+def _clipped_range(tables, index, radius, get_hit_radius):
+    """Gets the indices of the locations on the board that a range stencil covers around the location at index
+    """
+    size = tables.arena_size
+    in_bounds = tables.in_bounds
+    x, y = divmod(index, size)
+    indices = []
+    for dx, dy in _range_stencil(radius, get_hit_radius):
+        nx = x + dx
+        ny = y + dy
+        if 0 <= nx < size and 0 <= ny < size and in_bounds[nx * size + ny]:
+            indices.append(nx * size + ny)
+    return tuple(indices)
+
+
+class ArenaTables:
+    """Precomputed facts about the board that never change during a game.
+    Location [x, y] is stored at index x * arena_size + y. Do not modify these tables.
+
+    Attributes :
+        * arena_size (int): The size of the arena
+        * in_bounds (bytes): 1 at the index of every location on the diamond, 0 elsewhere
+        * locations (tuple): Every location on the diamond as an (x, y) tuple, row by row from the bottom, left to right
+        * half_locations (tuple): The locations of each player's half of the board, [0] for the bottom half and [1] for the top half
+        * neighbors (tuple): For each index, a tuple of the indices of the adjacent locations on the diamond, in the order up, down, right, left
+        * edges (tuple): For each edge, a tuple of its locations as (x, y) tuples, ordered like GameMap.get_edges
+        * edge_indices (tuple): For each edge, a frozenset of the indices of its locations
+
+    """
+    def __init__(self, arena_size):
+        self.arena_size = arena_size
+        half_arena = arena_size // 2
+
+        in_bounds = bytearray(arena_size * arena_size)
+        for x in range(arena_size):
+            for y in range(arena_size):
+                row_size = y + 1 if y < half_arena else arena_size - y
+                if half_arena - row_size <= x < half_arena + row_size:
+                    in_bounds[x * arena_size + y] = 1
+        self.in_bounds = bytes(in_bounds)
+        self.locations = tuple((x, y) for y in range(arena_size) for x in range(arena_size) if in_bounds[x * arena_size + y])
+        self.half_locations = (tuple(location for location in self.locations if location[1] < half_arena),
+            tuple(location for location in self.locations if location[1] >= half_arena))
+
+        neighbors = []
+        for x in range(arena_size):
+            for y in range(arena_size):
+                adjacent = []
+                if in_bounds[x * arena_size + y]:
+                    for nx, ny in [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]:
+                        if 0 <= nx < arena_size and 0 <= ny < arena_size and in_bounds[nx * arena_size + ny]:
+                            adjacent.append(nx * arena_size + ny)
+                neighbors.append(tuple(adjacent))
+        self.neighbors = tuple(neighbors)
+
+        top_right = tuple((half_arena + num, arena_size - 1 - num) for num in range(half_arena))
+        top_left = tuple((half_arena - 1 - num, arena_size - 1 - num) for num in range(half_arena))
+        bottom_left = tuple((half_arena - 1 - num, num) for num in range(half_arena))
+        bottom_right = tuple((half_arena + num, num) for num in range(half_arena))
+        self.edges = (top_right, top_left, bottom_left, bottom_right)
+        self.edge_indices = tuple(frozenset(x * arena_size + y for x, y in edge) for edge in self.edges)
+
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -11,6 +114,7 @@ class GameMap:
 
     Attributes :
         * config (JSON): Contains information about the current game rules
+        * unit_catalog (:obj: UnitCatalog): The unit types of the config, compiled once per game
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
         * ARENA_SIZE (int): The size of the arena.
         * HALF_ARENA (int): Half of the size of the arena.
@@ -19,6 +123,12 @@ class GameMap:
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
 
+    Besides the unit lists, the map keeps occupancy layers: for every location, how many units of each type
+    each player has there, their total health, and how many of them are upgraded. They are kept up to date by
+    add_unit, remove_unit, game_map[x, y] = units and the GameState parser, so board-wide questions like
+    "where are the enemy turrets" or "how much health is in this region" are single array operations.
+    See get_count_layer, get_health_layer and get_upgraded_layer.
+
     """
     def __init__(self, config):
         """Initializes constants and game map
@@ -35,8 +145,15 @@ class GameMap:
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
+        self._tables = arena_tables(self.ARENA_SIZE)
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__owned_locations = None
+        self.__journal = []
+        self.__structure_layout = 0
+        self.unit_catalog = UnitCatalog.for_config(config)
+        self.__get_hit_radius = self.unit_catalog.get_hit_radius
+        self.__unit_type_index = {unit_type: self.unit_catalog.UNIT_TYPE_TO_INDEX[unit_type] for unit_type in self.unit_catalog.ALL_UNITS}
+        self.__init_layers()
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,26 +163,42 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            self.__record(location[0], location[1])
             self.__map[location[0]][location[1]] = val
+            self.__set_structure_bit(location, any(unit.stationary for unit in val))
+            self.__refresh_layers(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return map(list, self._tables.locations)
+
+    def iterate_locations(self, player_index=None, edge=None):
+        """Iterates over locations on the board, like for location in game_map but limited to part of it.
+        Each call returns a new iterator, so iterations can be nested.
+
+        Args:
+            player_index: 0 for only your half of the board, 1 for only your opponent's half, None for the whole board
+            edge: Only the locations of an edge. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. None for every location
+
+        Returns:
+            An iterator over [x, y] locations, row by row from the bottom
+
+        """
+        if edge is not None:
+            if not edge in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
+                self.warn("Passed invalid edge '{}'. See the documentation for valid inputs for iterate_locations.".format(edge))
+                return iter(())
+            locations = sorted(self._tables.edges[edge], key=lambda location: (location[1], location[0]))
+            if player_index is not None:
+                locations = [location for location in locations if (location[1] >= self.HALF_ARENA) == (player_index == 1)]
+            return map(list, locations)
+        if player_index is None:
+            return map(list, self._tables.locations)
+        if player_index not in (0, 1):
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            return iter(())
+        return map(list, self._tables.half_locations[player_index])
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +208,314 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def __set_structure_bit(self, location, blocked):
+        bit = 1 << (location[0] * self.ARENA_SIZE + location[1])
+        if blocked:
+            self.__structure_layout |= bit
+        else:
+            self.__structure_layout &= ~bit
+
+    def __own_location(self, x, y):
+        """Makes the unit list at a location and its units private to this map before changing them in place.
+        Until then they may be shared with maps forked from this one, or with the map this one was forked from.
+        """
+        if self.__owned_locations is None:
+            return self.__map[x][y]
+        index = x * self.ARENA_SIZE + y
+        if index not in self.__owned_locations:
+            self.__map[x][y] = [copy.copy(unit) for unit in self.__map[x][y]]
+            self.__owned_locations.add(index)
+        return self.__map[x][y]
+
+    def fork(self):
+        """Creates a copy of this map to build hypothetical boards on, without changing this one.
+
+        Forking is cheap: the copy shares every unit list and GameUnit with this map, and a location is only
+        copied once add_unit, remove_unit or an upgrade changes it, in either map. Change forked maps through
+        those functions, editing the shared unit lists or units directly would change both maps.
+
+        Returns:
+            A new GameMap with the same units
+
+        """
+        child = GameMap.__new__(GameMap)
+        child.__dict__.update(self.__dict__)
+        child.__map = [list(column) for column in self.__map]
+        child.__unit_counts = self.__unit_counts[:]
+        child.__health = self.__health[:]
+        child.__upgraded = self.__upgraded[:]
+        child.__layer_views = None
+        child.__unit_index = {key: set(indices) for key, indices in self.__unit_index.items()}
+        child.__location_keys = dict(self.__location_keys)
+        if self.__threat_map is not None:
+            child.__threat_map = self.__threat_map.copy()
+        child.__owned_locations = set()
+        child.__journal = []
+        self.__owned_locations = set()
+        return child
+
+    def __record(self, x, y):
+        """Remembers the unit list at a location before it changes, if a checkpoint is active
+        """
+        if self.__journal:
+            self.__journal[-1][2].append((x, y, self.__map[x][y]))
+
+    def checkpoint(self):
+        """Starts recording changes to the map, so they can be undone with rollback.
+
+        Checkpoints nest: rollback and commit always apply to the latest one. While a checkpoint is active,
+        add_unit, remove_unit, game_map[x, y] = units, and upgrades only ever replace unit lists, so the lists
+        and units from before the checkpoint are kept intact and restoring them costs one step per change.
+        """
+        self.__journal.append((self.__structure_layout, self.__owned_locations, []))
+        self.__owned_locations = set()
+
+    def rollback(self):
+        """Undoes every change made to the map since the latest checkpoint, and ends that checkpoint
+        """
+        if not self.__journal:
+            self.warn("Attempted to rollback without a checkpoint.")
+            return
+        layout, _, changes = self.__journal.pop()
+        for x, y, units in reversed(changes):
+            self.__map[x][y] = units
+        for x, y, _ in changes:
+            self.__refresh_layers(x, y)
+        self.__structure_layout = layout
+        # The restored lists may be shared with maps forked during the checkpoint
+        self.__owned_locations = set()
+
+    def commit(self):
+        """Ends the latest checkpoint and keeps its changes. They can still be undone by rolling back an outer checkpoint
+        """
+        if not self.__journal:
+            self.warn("Attempted to commit without a checkpoint.")
+            return
+        _, _, changes = self.__journal.pop()
+        if self.__journal:
+            self.__journal[-1][2].extend(changes)
+
+    def structure_layout_key(self):
+        """Gets a key identifying which locations are currently blocked by structures.
+
+        The key is an integer with bit x * ARENA_SIZE + y set for every location holding a structure.
+        It is kept up to date by add_unit, remove_unit and game_map[x, y] = units, so two maps with the same
+        key have identical pathing. Editing the unit lists returned by game_map[x, y] directly bypasses it.
+
+        Returns:
+            An integer describing the current structure layout
+        """
+        return self.__structure_layout
+
+    def _place_unit(self, unit):
+        """
+        Used internally by game_state to put an already built GameUnit on the map while parsing.
+        """
+        x, y = unit.x, unit.y
+        self.__record(x, y)
+        self.__own_location(x, y).append(unit)
+        if unit.stationary:
+            self.__set_structure_bit([x, y], True)
+        index = x * self.ARENA_SIZE + y
+        self.__add_to_layers(index, unit)
+        if self.__threat_map is not None:
+            self.__threat_map._refresh_location(index, self.__map[x][y])
+
+    def _upgrade_unit(self, unit):
+        """
+        Used internally by game_state to upgrade a GameUnit that is on the map.
+        """
+        x, y = unit.x, unit.y
+        if not self.in_arena_bounds([x, y]):
+            unit.upgrade()
+            return
+        self.__record(x, y)
+        for position, location_unit in enumerate(self.__map[x][y]):
+            if location_unit is unit:
+                unit = self.__own_location(x, y)[position]
+                break
+        # Only the upgraded layer and the threats of the unit change, its type, owner and health stay the same
+        counted = not unit.upgraded and unit.unit_type in self.__unit_type_index and unit.player_index in (0, 1)
+        unit.upgrade()
+        index = x * self.ARENA_SIZE + y
+        if counted:
+            self.__upgraded[index] += 1
+        if self.__threat_map is not None:
+            self.__threat_map._refresh_location(index, self.__map[x][y])
+
+    def __init_layers(self):
+        num_locations = self.ARENA_SIZE * self.ARENA_SIZE
+        self.__num_unit_types = len(self.__unit_type_index)
+        self.__unit_counts = array('h', bytes(2 * 2 * self.__num_unit_types * num_locations))
+        self.__health = array('d', bytes(8 * 2 * num_locations))
+        self.__upgraded = array('h', bytes(2 * num_locations))
+        self.__layer_views = None
+        self.__unit_index = {}
+        self.__location_keys = {}
+        self.__threat_map = None
+
+    def __add_to_layers(self, index, unit):
+        """Adds one unit to the occupancy layers and the unit index at a location, without going over the other units there
+        """
+        type_index = self.__unit_type_index.get(unit.unit_type)
+        if type_index is None or unit.player_index not in (0, 1):
+            return
+        num_locations = self.ARENA_SIZE * self.ARENA_SIZE
+        self.__unit_counts[(unit.player_index * self.__num_unit_types + type_index) * num_locations + index] += 1
+        self.__health[unit.player_index * num_locations + index] += unit.health
+        self.__upgraded[index] += unit.upgraded
+        key = (unit.player_index, unit.unit_type)
+        keys = self.__location_keys.get(index, ())
+        if key not in keys:
+            # The key sets may be shared with forked maps, so they are replaced rather than changed
+            self.__location_keys[index] = set(keys) | {key}
+            self.__unit_index.setdefault(key, set()).add(index)
+
+    def __refresh_layers(self, x, y):
+        """Recomputes every occupancy layer and the unit index at one location from its unit list
+        """
+        num_locations = self.ARENA_SIZE * self.ARENA_SIZE
+        index = x * self.ARENA_SIZE + y
+        counts = self.__unit_counts
+        for layer in range(2 * self.__num_unit_types):
+            counts[layer * num_locations + index] = 0
+        health = [0.0, 0.0]
+        upgraded = 0
+        keys = set()
+        for unit in self.__map[x][y]:
+            type_index = self.__unit_type_index.get(unit.unit_type)
+            if type_index is None or unit.player_index not in (0, 1):
+                continue
+            counts[(unit.player_index * self.__num_unit_types + type_index) * num_locations + index] += 1
+            health[unit.player_index] += unit.health
+            upgraded += unit.upgraded
+            keys.add((unit.player_index, unit.unit_type))
+        self.__health[index] = health[0]
+        self.__health[num_locations + index] = health[1]
+        self.__upgraded[index] = upgraded
+
+        old_keys = self.__location_keys.get(index, ())
+        for key in old_keys:
+            if key not in keys:
+                self.__unit_index[key].discard(index)
+        for key in keys:
+            if key not in old_keys:
+                self.__unit_index.setdefault(key, set()).add(index)
+        if keys:
+            self.__location_keys[index] = keys
+        elif old_keys:
+            del self.__location_keys[index]
+        if self.__threat_map is not None:
+            self.__threat_map._refresh_location(index, self.__map[x][y])
+
+    def get_threat_map(self):
+        """Gets the damage per frame mobile units would take at every location, see threat_map.py.
+        It is built on the first call, then kept up to date as units are added, removed or upgraded.
+
+        Returns:
+            The ThreatMap of this map
+
+        """
+        if self.__threat_map is None:
+            threat_map = ThreatMap(self.ARENA_SIZE, self._tables)
+            for index in self.__location_keys:
+                threat_map._refresh_location(index, self.get_units_at_index(index))
+            self.__threat_map = threat_map
+        return self.__threat_map
+
+    def _adopt_threat_map(self, game_map):
+        """Starts from a copy of the threat map of another map, if it has one, and updates the locations where the units differ
+        """
+        if game_map.__threat_map is None:
+            return
+        threat_map = game_map.__threat_map.copy()
+        for index in set(threat_map._sources).union(self.__location_keys):
+            threat_map._refresh_location(index, self.get_units_at_index(index))
+        self.__threat_map = threat_map
+
+    def get_unit_locations(self, unit_type, player_index, upgraded=None):
+        """Gets the locations holding units of a type controlled by a player, for example all enemy turrets.
+
+        The map keeps an index of these locations up to date, like the occupancy layers, so this takes time
+        proportional to the number of matching locations instead of scanning the whole board.
+
+        Args:
+            unit_type: The type of the units to find
+            player_index: The player that controls the units, 0 for you 1 for the enemy
+            upgraded: True for only upgraded units, False for only units that are not upgraded, None for both
+
+        Returns:
+            A list of [x, y] locations, row by row from the bottom
+
+        """
+        indices = self.__unit_index.get((player_index, unit_type), ())
+        if upgraded is not None:
+            indices = [index for index in indices if any(unit.unit_type == unit_type and unit.player_index == player_index and unit.upgraded == upgraded
+                for unit in self.get_units_at_index(index))]
+        size = self.ARENA_SIZE
+        return [list(divmod(index, size)) for index in sorted(indices, key=lambda index: (index % size, index))]
+
+    def __get_layer(self, values, layer):
+        """Gets one ARENA_SIZE * ARENA_SIZE layer of a flat array, as a read only NumPy view when NumPy is installed
+        """
+        num_locations = self.ARENA_SIZE * self.ARENA_SIZE
+        if numpy is None:
+            return values[layer * num_locations:(layer + 1) * num_locations]
+        if self.__layer_views is None:
+            views = {}
+            for name, flat in [("counts", self.__unit_counts), ("health", self.__health), ("upgraded", self.__upgraded)]:
+                view = numpy.frombuffer(flat, dtype=flat.typecode).reshape(-1, self.ARENA_SIZE, self.ARENA_SIZE)
+                view.flags.writeable = False
+                views[id(flat)] = view
+            self.__layer_views = views
+        return self.__layer_views[id(values)][layer]
+
+    def get_count_layer(self, unit_type, player_index):
+        """Gets how many units of a type a player has at every location.
+
+        With NumPy installed this is an ARENA_SIZE by ARENA_SIZE array indexed [x, y]. It is a read only view that
+        stays in sync with the map, so for example layer.sum() counts the units and numpy.argwhere(layer) lists
+        their locations. Without NumPy it is a flat array with location [x, y] at index x * ARENA_SIZE + y.
+        Editing the unit lists returned by game_map[x, y] directly bypasses the layers.
+
+        Args:
+            unit_type: The type of the units to count
+            player_index: The player that controls the units, 0 for you 1 for the enemy
+
+        Returns:
+            The count of those units at every location
+
+        """
+        type_index = self.__unit_type_index.get(unit_type)
+        if type_index is None or player_index not in (0, 1):
+            self.warn("No count layer for unit type {} and player index {}.".format(unit_type, player_index))
+            return
+        return self.__get_layer(self.__unit_counts, player_index * self.__num_unit_types + type_index)
+
+    def get_health_layer(self, player_index):
+        """Gets the total health of a player's units at every location, laid out like get_count_layer
+
+        Args:
+            player_index: The player that controls the units, 0 for you 1 for the enemy
+
+        Returns:
+            The total health of that player's units at every location
+
+        """
+        if player_index not in (0, 1):
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            return
+        return self.__get_layer(self.__health, player_index)
+
+    def get_upgraded_layer(self):
+        """Gets the number of upgraded units at every location, laid out like get_count_layer
+
+        Returns:
+            The number of upgraded units of either player at every location
+
+        """
+        return self.__get_layer(self.__upgraded, 0)
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,6 +530,9 @@ class GameMap:
         
         """
         x, y = location
+        if type(x) == int and type(y) == int:
+            size = self.ARENA_SIZE
+            return 0 <= x < size and 0 <= y < size and self._tables.in_bounds[x * size + y] == 1
         half_board = self.HALF_ARENA
 
         row_size = y + 1
@@ -161,17 +605,27 @@ class GameMap:
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
         desynchronize it from the actual gamestate, and can cause issues. 
         """
-        if not self.in_arena_bounds(location):
+        in_bounds = self.in_arena_bounds(location)
+        if not in_bounds:
             self._invalid_coordinates(location)
         if player_index < 0 or player_index > 1:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1], self.unit_catalog)
+        if in_bounds:
+            self.__record(x, y)
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            if in_bounds:
+                self.__own_location(x, y).append(new_unit)
+            else:
+                self.__map[x][y].append(new_unit)
         else:
             self.__map[x][y] = [new_unit]
+            if in_bounds:
+                self.__set_structure_bit(location, True)
+        if in_bounds:
+            self.__refresh_layers(x, y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -182,11 +636,17 @@ class GameMap:
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the GameMap inside game_state can cause your algo to crash.
         """
-        if not self.in_arena_bounds(location):
+        in_bounds = self.in_arena_bounds(location)
+        if not in_bounds:
             self._invalid_coordinates(location)
         
         x, y = location
+        if in_bounds:
+            self.__record(x, y)
         self.__map[x][y] = []
+        if in_bounds:
+            self.__set_structure_bit(location, False)
+            self.__refresh_layers(x, y)
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -205,9 +665,12 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
+        if type(x) == int and type(y) == int and 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE:
+            return [list(divmod(index, self.ARENA_SIZE)) for index in _clipped_range(self._tables, x * self.ARENA_SIZE + y, radius, self.__get_hit_radius)]
+
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+        getHitRadius = self.__get_hit_radius
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
@@ -216,6 +679,32 @@ class GameMap:
                     locations.append(new_location)
         return locations
 
+    def get_location_indices_in_range(self, location, radius):
+        """Gets the same locations as get_locations_in_range, as indices x * ARENA_SIZE + y.
+
+        The offsets covered by each radius are computed once, and so is the result for each location on the board,
+        so repeated calls cost nothing. Use game_map.get_units_at_index to read the units at an index.
+
+        Args:
+            location: The center of our search area
+            radius: The radius of our search area
+
+        Returns:
+            A tuple of the indices of the locations within our search area. Do not modify it, it is shared.
+
+        """
+        x, y = location
+        if type(x) == int and type(y) == int and 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE and 0 <= radius <= self.ARENA_SIZE:
+            if not self._tables.in_bounds[x * self.ARENA_SIZE + y]:
+                self._invalid_coordinates(location)
+            return _clipped_range(self._tables, x * self.ARENA_SIZE + y, radius, self.__get_hit_radius)
+        return tuple(i * self.ARENA_SIZE + j for i, j in self.get_locations_in_range(location, radius))
+
+    def get_units_at_index(self, index):
+        """Gets the list of units at a location given as index x * ARENA_SIZE + y, like game_map[x, y] without the bounds checks
+        """
+        return self.__map[index // self.ARENA_SIZE][index % self.ARENA_SIZE]
+
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
 
@@ -3,9 +3,11 @@ import json
 import sys
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_command, debug_write, parse_json
 from .unit import GameUnit
 from .game_map import GameMap
+from .unit_catalog import UnitCatalog
+from .unit_table import UnitTable
 
 def is_stationary(unit_type):
     """
@@ -17,6 +19,24 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+def _use_catalog(catalog):
+    """Points the module constants at a catalog, only needed when the config changes
+    """
+    global WALL, FACTORY, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
+    WALL = catalog.WALL
+    FACTORY = catalog.FACTORY
+    TURRET = catalog.TURRET
+    SCOUT = catalog.SCOUT
+    DEMOLISHER = catalog.DEMOLISHER
+    INTERCEPTOR = catalog.INTERCEPTOR
+    REMOVE = catalog.REMOVE
+    UPGRADE = catalog.UPGRADE
+    UNIT_TYPE_TO_INDEX = catalog.UNIT_TYPE_TO_INDEX
+    ALL_UNITS = list(catalog.ALL_UNITS)
+    STRUCTURE_TYPES = list(catalog.STRUCTURE_TYPES)
+
+_catalog = None
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -32,6 +52,7 @@ class GameState:
         * REMOVE (str): A constant representing removing your own unit
         * UPGRADE (str): A constant representing upgrading a unit
         * STRUCTURE_TYPES (list): A list of the structure units
+        * unit_catalog (:obj: UnitCatalog): The unit types of the config, compiled once per game
 
         * ARENA_SIZE (int): The size of the arena
         * HALF_ARENA (int): Half the size of the arena
@@ -39,12 +60,16 @@ class GameState:
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
         * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
+        * unit_table (:obj: UnitTable): Every parsed unit in columns, for filtering and aggregating units with NumPy
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
 
+    Resources, health and the turn number are read when the game state is created. The units are only placed on
+    game_map and unit_table the first time either is used, so turns that only look at resources never build the map.
+
     """
 
     def __init__(self, config, serialized_string):
@@ -52,34 +77,19 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn, or the already decoded dict
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
 
-        global WALL, FACTORY, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        FACTORY = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[FACTORY] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, FACTORY, TURRET]
-        STRUCTURE_TYPES = [WALL, FACTORY, TURRET]
+        global _catalog
+        self.unit_catalog = UnitCatalog.for_config(config)
+        # Copies of the config compile to a catalog of their own, with the same unit types
+        if _catalog is None or self.unit_catalog.UNIT_TYPE_TO_INDEX != _catalog.UNIT_TYPE_TO_INDEX:
+            _use_catalog(self.unit_catalog)
+            _catalog = self.unit_catalog
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -89,21 +99,91 @@ class GameState:
         MP = self.MP
         SP = self.SP
 
-        self.game_map = GameMap(self.config)
+        self.__game_map = None
+        self.__unit_table = None
+        self.__pending_units = None
         self._shortest_path_finder = ShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._journal = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
         self.__parse_state(serialized_string)
 
+    def fork(self):
+        """Creates a copy of this game state to try out hypothetical turns on, without changing this one.
+
+        The map is forked copy-on-write, see GameMap.fork, so forking costs about the same whatever is on the board.
+        Resources, the build and deploy stacks and the cached paths are copied. Changes made to either game state
+        through attempt_spawn, attempt_remove, attempt_upgrade or game_map.add_unit and remove_unit do not show up in the other.
+
+        Returns:
+            A new GameState
+
+        """
+        game_map = self.game_map.fork()
+        child = GameState.__new__(GameState)
+        child.__dict__.update(self.__dict__)
+        child.game_map = game_map
+        child._shortest_path_finder = self._shortest_path_finder.fork()
+        child._build_stack = list(self._build_stack)
+        child._deploy_stack = list(self._deploy_stack)
+        child._player_resources = [dict(resources) for resources in self._player_resources]
+        child._journal = []
+        return child
+
+    def warm_start(self, game_state):
+        """Takes over the cached distance fields, paths and threat map of a game state of an earlier board, like one
+        from AlgoCore.precompute. They are updated only for the structures that differ between the two boards:
+        distance fields are repaired around the changed locations when few changed, and the threat map only for changed locations.
+
+        Args:
+            game_state: The GameState to take the caches from, it is not changed
+
+        """
+        self._shortest_path_finder = game_state._shortest_path_finder.fork()
+        self.game_map._adopt_threat_map(game_state.game_map)
+
+    def checkpoint(self):
+        """Starts recording changes to the game state, so they can be undone with rollback.
+
+        Use this instead of fork to explore hypothetical turns depth first: checkpoint, try some
+        attempt_spawn, attempt_upgrade and attempt_remove calls, look at the result, then rollback.
+        Changes made through game_map.add_unit and remove_unit are recorded too. Checkpoints nest,
+        and rolling back costs one step per change instead of a copy of the board.
+        """
+        self._journal.append(([dict(resources) for resources in self._player_resources], len(self._build_stack), len(self._deploy_stack)))
+        self.game_map.checkpoint()
+
+    def rollback(self):
+        """Restores the game state to the latest checkpoint, including resources and the build and deploy stacks,
+        and ends that checkpoint
+        """
+        if not self._journal:
+            self.warn("Attempted to rollback without a checkpoint.")
+            return
+        self._player_resources, build_size, deploy_size = self._journal.pop()
+        del self._build_stack[build_size:]
+        del self._deploy_stack[deploy_size:]
+        self.game_map.rollback()
+
+    def commit(self):
+        """Ends the latest checkpoint and keeps its changes. They can still be undone by rolling back an outer checkpoint
+        """
+        if not self._journal:
+            self.warn("Attempted to commit without a checkpoint.")
+            return
+        self._journal.pop()
+        self.game_map.commit()
+
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or the dict it decodes to.
+        The units are kept to be placed on the map by __place_parsed_units when it is first needed.
         """
-        state = json.loads(state_line)
+        state = state_line if isinstance(state_line, dict) else parse_json(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -120,20 +200,48 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
+        self.__pending_units = (state["p1Units"], state["p2Units"])
+
+    @property
+    def game_map(self):
+        if self.__pending_units is not None:
+            self.__place_parsed_units()
+        return self.__game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        if self.__pending_units is not None:
+            self.__place_parsed_units()
+        self.__game_map = game_map
+
+    @property
+    def unit_table(self):
+        if self.__pending_units is not None:
+            self.__place_parsed_units()
+        return self.__unit_table
 
+    def __place_parsed_units(self):
+        """
+        Builds the map and the unit table from the units kept by __parse_state.
+        """
+        p1units, p2units = self.__pending_units
+        self.__pending_units = None
+        self.__game_map = GameMap(self.config)
+        self.__unit_table = UnitTable(self.unit_catalog)
         self.__create_parsed_units(p1units, 0)
         self.__create_parsed_units(p2units, 1)
 
     def __create_parsed_units(self, units, player_number):
         """
-        Helper function for __parse_state to add units to the map.
+        Helper function for __parse_state to add units to the map and the unit table.
         """
-        typedef = self.config.get("unitInformation")
+        shorthands = list(self.unit_catalog.UNIT_TYPE_TO_INDEX)
+        table = self.__unit_table
+        # The row of the first unit at each location, which is the one removals and upgrades apply to
+        first_rows = {}
         for i, unit_types in enumerate(units):
             for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
+                unit_type = shorthands[i]
                 sx, sy, shp = uinfo[:3]
                 x, y = map(int, [sx, sy])
                 hp = float(shp)
@@ -142,15 +250,25 @@ class GameState:
                     # Quick fix will deploy engine fix soon
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].pending_removal = True
+                        if (x, y) in first_rows:
+                            table.pending_removal[first_rows[x, y]] = 1
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map._upgrade_unit(self.game_map[x,y][0])
+                        if (x, y) in first_rows:
+                            table.upgraded[first_rows[x, y]] = 1
                 else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y, self.unit_catalog)
+                    self.game_map._place_unit(unit)
+                    try:
+                        unit_id = int(uinfo[3])
+                    except (IndexError, TypeError, ValueError):
+                        unit_id = -1
+                    row = table._append(x, y, i, player_number, unit.health, unit_id)
+                    first_rows.setdefault((x, y), row)
 
     def __resource_required(self, unit_type):
-        return self.SP if is_stationary(unit_type) else self.MP
+        return self.SP if self.unit_catalog.is_stationary(unit_type) else self.MP
 
     def __set_resource(self, resource_type, amount, player_index=0):
         """
@@ -296,12 +414,7 @@ class GameState:
             self._invalid_unit(unit_type)
             return
         
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
-        if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
-
-        return cost_base
+        return self.unit_catalog.type_cost(unit_type, upgrade)
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -330,7 +443,7 @@ class GameState:
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
+        stationary = self.unit_catalog.is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
         on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
@@ -382,7 +495,7 @@ class GameState:
                     self.__set_resource(SP, 0 - costs[SP])
                     self.__set_resource(MP, 0 - costs[MP])
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
+                    if self.unit_catalog.is_stationary(unit_type):
                         self._build_stack.append((unit_type, x, y))
                     else:
                         self._deploy_stack.append((unit_type, x, y))
@@ -435,13 +548,13 @@ class GameState:
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
+                if not existing_unit.upgraded and self.unit_catalog.can_upgrade(existing_unit.unit_type):
                     costs = self.type_cost(existing_unit.unit_type, True)
                     resources = self.get_resources()
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map._upgrade_unit(existing_unit)
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -494,6 +607,117 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def find_paths_to_edge_batch(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take, sharing the pathfinding work between them.
+        Use this instead of calling find_path_to_edge in a loop, for example to compare every spawn location.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start location if None.
+
+        Returns:
+            A list with the path find_path_to_edge would return for each start location, in the same order.
+            The entry is None if that start location is blocked.
+
+        """
+        paths = [None] * len(start_locations)
+        starts_by_edge = {}
+        for index, start_location in enumerate(start_locations):
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            starts_by_edge.setdefault(edge, []).append(index)
+
+        for edge, indices in starts_by_edge.items():
+            end_points = self.game_map.get_edge_locations(edge)
+            edge_paths = self._shortest_path_finder.navigate_batch([start_locations[index] for index in indices], end_points, self)
+            for index, path in zip(indices, edge_paths):
+                paths[index] = path
+        return paths
+
+    def get_distance_field(self, target_edge):
+        """Gets how many steps a unit at any location would take towards the given edge, computed once for the whole board.
+        Prefer this to find_path_to_edge when only path lengths are needed for many locations.
+
+        Args:
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+
+        Returns:
+            A DistanceField, see navigation.py. Use field.get_pathlength(location) and field.get_target(location) to read it.
+
+        """
+        return self._shortest_path_finder.distance_field(self, target_edge)
+
+    def get_distance_fields(self, target_edges):
+        """Gets the distance fields towards several edges, like get_distance_field for each of them.
+        Asking for all four edges at once lets the pathfinder compute them together, which is faster with NumPy.
+
+        Args:
+            target_edges: A list of edges. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+
+        Returns:
+            A list with the DistanceField of each edge, in order
+
+        """
+        return self._shortest_path_finder.distance_fields(self, target_edges)
+
+    def get_wall_effects(self, candidate_locations, start_locations, target_edge=None):
+        """Finds how the paths of units at start_locations would change if a wall were placed at each candidate location.
+        Use this to pick wall placements by their effect, for example to lengthen the path of enemy units.
+
+        Candidates that are on none of the current paths cannot change them, so they are not pathed again.
+        The other candidates are tried out one at a time, and the pathfinder repairs its distance fields
+        around each one instead of searching the whole board again.
+
+        Args:
+            candidate_locations: A list of locations where a wall could be placed
+            start_locations: A list of locations of hypothetical units, for example enemy spawn locations
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start location if None.
+
+        Returns:
+            A list with an entry for each candidate location, in the same order. Each entry is a list with a
+            (pathlength, end_location) tuple for each start location, where pathlength is the number of steps the
+            unit takes and end_location is the last location of its path. A start location that is blocked, or
+            that the candidate wall would block, gets None instead. The entry for a candidate is None if the
+            candidate is outside the arena or already holds a structure.
+
+        """
+        def get_effects(paths):
+            return [None if path is None else (len(path) - 1, path[-1]) for path in paths]
+
+        current_paths = self.find_paths_to_edge_batch(start_locations, target_edge)
+        current_effects = get_effects(current_paths)
+        on_path = set()
+        for path in current_paths:
+            if path is not None:
+                on_path.update(tuple(location) for location in path)
+
+        effects = []
+        for location in candidate_locations:
+            if not self.game_map.in_arena_bounds(location):
+                self.warn("Attempted to evaluate a wall outside of arena bounds at {}".format(location))
+                effects.append(None)
+                continue
+            x, y = map(int, location)
+            if self.contains_stationary_unit([x, y]):
+                effects.append(None)
+                continue
+            if (x, y) not in on_path:
+                effects.append(list(current_effects))
+                continue
+
+            units = self.game_map[x, y]
+            self.game_map.add_unit(WALL, [x, y], 0)
+            warnings = self.enable_warnings
+            self.enable_warnings = False
+            try:
+                effects.append(get_effects(self.find_paths_to_edge_batch(start_locations, target_edge)))
+            finally:
+                self.enable_warnings = warnings
+                self.game_map[x, y] = units
+        return effects
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -551,22 +775,25 @@ class GameState:
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
+        game_map = self.game_map
+        possible_locations = game_map.get_location_indices_in_range(attacker_location, attacking_unit.attackRange)
         target = None
         target_stationary = True
         target_distance = sys.maxsize
         target_health = sys.maxsize
         target_y = self.ARENA_SIZE
         target_x_distance = 0
+        structure_types = self.unit_catalog.STRUCTURE_TYPES
 
-        for location in possible_locations:
-            for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
+        for index in possible_locations:
+            location = divmod(index, self.ARENA_SIZE)
+            for unit in game_map.get_units_at_index(index):
+                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and unit.unit_type in structure_types) or (attacking_unit.damage_i == 0 and unit.unit_type not in structure_types):
                     continue
 
                 new_target = False
                 unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
+                unit_distance = game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
                 unit_health = unit.health
                 unit_y = unit.y
                 unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
@@ -631,13 +858,12 @@ class GameState:
         """
         Get locations in the range of TURRET units
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
-        for location_unit in possible_locations:
-            for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+        max_range = self.unit_catalog.max_attack_range
+        game_map = self.game_map
+        possible_locations = game_map.get_location_indices_in_range(location, max_range)
+        for index in possible_locations:
+            location_unit = divmod(index, self.ARENA_SIZE)
+            for unit in game_map.get_units_at_index(index):
+                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
                     attackers.append(unit)
         return attackers
@@ -1,24 +1,235 @@
 import heapq
 import math
 import sys
-import queue
+from array import array
+from collections import deque
+from .game_map import arena_tables
 from .util import debug_write
 
-class Node:
-    """A pathfinding node
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_TARGETS = {}
+_MAX_CACHED_TARGETS = 64
+_MAX_REPAIRED_LOCATIONS = 8
+_WAVEFRONT_MASKS = {}
+_BITBOARD_MASKS = {}
+
+def _target_tables(tables, end_key):
+    """Gets the tables describing a set of end points, building them on first use.
+
+    Returns:
+        A tuple (end_indices, idealness, direction). end_indices holds the index of each end point on the board,
+        idealness holds the idealness of every index (see ShortestPathFinder._idealness_search) and
+        direction is the [x, y] direction of the edge, for example [1, 1] for the top right and [-1, 1] for the top left
+
+    """
+    key = (tables.arena_size, end_key)
+    target = _TARGETS.get(key)
+    if target is not None:
+        return target
+
+    size = tables.arena_size
+    half_arena = size // 2
+    end_indices = tuple(x * size + y for x, y in end_key if 0 <= x < size and 0 <= y < size and tables.in_bounds[x * size + y])
+    x, y = end_key[0]
+    direction = [-1 if x < half_arena else 1, -1 if y < half_arena else 1]
+
+    #Better self destruct locations are more ideal. The endpoints are perfectly ideal.
+    idealness = []
+    for x in range(size):
+        for y in range(size):
+            row_idealness = size * y if direction[1] == 1 else size * (size - 1 - y)
+            column_idealness = x if direction[0] == 1 else size - 1 - x
+            idealness.append(row_idealness + column_idealness)
+    for index in end_indices:
+        idealness[index] = sys.maxsize
+
+    target = (end_indices, idealness, direction)
+    if len(_TARGETS) < _MAX_CACHED_TARGETS:
+        _TARGETS[key] = target
+    return target
+
+def _wavefront_masks(tables):
+    """Gets the padded NumPy masks of the board and of the four edges used by ShortestPathFinder._wavefront_fields
+    """
+    masks = _WAVEFRONT_MASKS.get(tables.arena_size)
+    if masks is not None:
+        return masks
+
+    size = tables.arena_size
+    width = size + 2
+    in_bounds = numpy.zeros((width, width), dtype=bool)
+    in_bounds[1:-1, 1:-1] = numpy.frombuffer(tables.in_bounds, dtype=numpy.uint8).reshape(size, size) != 0
+    edge_masks = numpy.zeros((4, width, width), dtype=bool)
+    for edge, edge_locations in enumerate(tables.edges):
+        for x, y in edge_locations:
+            edge_masks[edge, x + 1, y + 1] = True
+
+    masks = (in_bounds.reshape(width * width), edge_masks.reshape(4, width * width))
+    _WAVEFRONT_MASKS[size] = masks
+    return masks
+
+class DistanceField:
+    """The validated pathlength from every location on the board towards one target edge.
+    Location [x, y] is stored at index x * ARENA_SIZE + y. Treat the arrays as read only, fields are cached and shared.
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * target_edge (int): The edge the field leads to
+        * arena_size (int): The size of the arena
+        * pathlength (array): The number of steps a unit at each location still has to take, -1 for blocked or off-board locations
+        * targets (array): -1 for locations that can reach the edge, otherwise the index of the self destruct location the unit paths to
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, target_edge, arena_size, pathlength, targets):
+        self.target_edge = target_edge
+        self.arena_size = arena_size
+        self.pathlength = pathlength
+        self.targets = targets
+
+    def get_pathlength(self, location):
+        """Gets the number of steps a unit at the given location takes to reach its target, or -1 if it cannot stand there
+        """
+        return self.pathlength[location[0] * self.arena_size + location[1]]
+
+    def reaches_edge(self, location):
+        """Checks if a unit at the given location can reach the target edge
+        """
+        index = location[0] * self.arena_size + location[1]
+        return self.pathlength[index] != -1 and self.targets[index] == -1
+
+    def get_target(self, location):
+        """Gets the self destruct location a unit at the given location paths to, or None if it reaches the edge or cannot stand there
+        """
+        target = self.targets[location[0] * self.arena_size + location[1]]
+        if target == -1:
+            return None
+        return list(divmod(target, self.arena_size))
+
+class _FieldRepair:
+    """Updates the arrays of a distance field in place as single locations become blocked or free.
+    blocked must describe the board before each call, and is updated by it.
+    """
+    def __init__(self, tables, target_edge, blocked, pathlength, targets):
+        self.neighbors = tables.neighbors
+        self.edge_indices = tables.edge_indices[target_edge]
+        self.idealness = _target_tables(tables, tables.edges[target_edge])[1]
+        self.blocked = blocked
+        self.pathlength = pathlength
+        self.targets = targets
+
+    def block(self, index):
+        neighbors, blocked, pathlength, targets = self.neighbors, self.blocked, self.pathlength, self.targets
+        old_pathlength = pathlength[index]
+        old_target = targets[index]
+        blocked[index] = 1
+        pathlength[index] = -1
+        targets[index] = -1
+        if old_pathlength == -1:
+            return
+
+        if old_target != -1:
+            #A self destruct pocket is small, solve what is left of it again
+            solved = set()
+            for neighbor in neighbors[index]:
+                if not blocked[neighbor] and neighbor not in solved:
+                    solved.update(self.solve_component(neighbor))
+            return
+
+        #Find the locations whose every shortest route led through the new wall, level by level
+        affected = set()
+        current = deque(neighbor for neighbor in neighbors[index] if not blocked[neighbor] and pathlength[neighbor] == old_pathlength + 1)
+        seen = set(current)
+        while current:
+            location = current.popleft()
+            parent_pathlength = pathlength[location] - 1
+            if any(not blocked[neighbor] and neighbor not in affected and pathlength[neighbor] == parent_pathlength for neighbor in neighbors[location]):
+                continue
+            affected.add(location)
+            for neighbor in neighbors[location]:
+                if not blocked[neighbor] and neighbor not in seen and pathlength[neighbor] == parent_pathlength + 2:
+                    seen.add(neighbor)
+                    current.append(neighbor)
+
+        #Their pathlengths can only grow, rebuild them from the unaffected locations around them
+        frontier = []
+        for location in affected:
+            entries = [pathlength[neighbor] + 1 for neighbor in neighbors[location] if not blocked[neighbor] and neighbor not in affected]
+            if entries:
+                heapq.heappush(frontier, (min(entries), location))
+        for location in affected:
+            pathlength[location] = -1
+        while frontier:
+            location_pathlength, location = heapq.heappop(frontier)
+            if location not in affected:
+                continue
+            affected.discard(location)
+            pathlength[location] = location_pathlength
+            for neighbor in neighbors[location]:
+                if neighbor in affected:
+                    heapq.heappush(frontier, (location_pathlength + 1, neighbor))
+
+        #Whatever is left was cut off from the edge and becomes self destruct pockets
+        while affected:
+            affected.difference_update(self.solve_component(next(iter(affected))))
+
+    def free(self, index):
+        neighbors, blocked, pathlength, targets = self.neighbors, self.blocked, self.pathlength, self.targets
+        blocked[index] = 0
+        edge_pathlengths = [pathlength[neighbor] for neighbor in neighbors[index] if not blocked[neighbor] and targets[neighbor] == -1]
+        if index not in self.edge_indices and not edge_pathlengths:
+            #Only pockets meet here, and the merged pocket may have a new self destruct location
+            self.solve_component(index)
+            return
+
+        #Pathlengths can only shrink, and every change spreads out from the freed location
+        pathlength[index] = 0 if index in self.edge_indices else min(edge_pathlengths) + 1
+        targets[index] = -1
+        current = deque([index])
+        while current:
+            location = current.popleft()
+            next_pathlength = pathlength[location] + 1
+            for neighbor in neighbors[location]:
+                if not blocked[neighbor] and (targets[neighbor] != -1 or pathlength[neighbor] > next_pathlength):
+                    pathlength[neighbor] = next_pathlength
+                    targets[neighbor] = -1
+                    current.append(neighbor)
+
+    def solve_component(self, seed):
+        """Recomputes the pathlengths and targets of the whole pathable area around seed, and returns its locations
+        """
+        neighbors, blocked, pathlength, targets = self.neighbors, self.blocked, self.pathlength, self.targets
+        component = [seed]
+        seen = {seed}
+        for location in component:
+            for neighbor in neighbors[location]:
+                if not blocked[neighbor] and neighbor not in seen:
+                    seen.add(neighbor)
+                    component.append(neighbor)
+
+        most_ideal = max(component, key=self.idealness.__getitem__)
+        if most_ideal in self.edge_indices:
+            seeds = [location for location in component if location in self.edge_indices]
+            target = -1
+        else:
+            seeds = [most_ideal]
+            target = most_ideal
+
+        for location in component:
+            pathlength[location] = -1
+            targets[location] = target
+        for location in seeds:
+            pathlength[location] = 0
+        current = deque(seeds)
+        while current:
+            location = current.popleft()
+            for neighbor in neighbors[location]:
+                if not blocked[neighbor] and pathlength[neighbor] == -1:
+                    pathlength[neighbor] = pathlength[location] + 1
+                    current.append(neighbor)
+        return seen
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -33,13 +244,38 @@ class ShortestPathFinder:
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): Is there a structure at each location
+        * visited_idealness (bytearray): Have we visited each location during the idealness search step?
+        * visited_validate (bytearray): Have we visited each location during the validation step?
+        * pathlength (array): The distance between each location and the target location, -1 if unknown
+        * use_numpy (bool): Let distance_fields compute all four edges in one NumPy sweep. True by default when NumPy is installed
+
+    The grids are flat, location [x, y] is stored at index x * ARENA_SIZE + y. They are allocated
+    once and reset before every search, so pathfinding does not create any per-location objects.
+    Neighbors, board bounds and idealness are read from tables shared by the whole process, see game_map.arena_tables.
+
+    Paths and distance fields are cached per structure layout, see GameMap.structure_layout_key. Repeating a query
+    on an unchanged board returns the cached result, and any structure added or removed through GameMap
+    invalidates the cache. When only a few locations changed since distance fields were last computed,
+    those fields are repaired around the changed locations instead of being searched again from scratch,
+    which keeps trying out many candidate structures cheap. Paths to an edge are read from these fields.
+
+    Each edge is searched on its own by default. When distance_fields asks for all four edges of a new layout and
+    NumPy is installed, they are computed in one breadth first sweep over boolean masks, one channel per edge,
+    which only pays off when every edge is needed. Both give the same fields, and paths are always read from
+    them with the same tie-breaking.
 
     """
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self._size = 0
+        self._cache_layout = None
+        self._path_cache = {}
+        self._field_cache = {}
+        self._previous_fields = None
+        self.use_numpy = numpy is not None
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -50,7 +286,21 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        size = game_state.ARENA_SIZE
+        if size != self._size:
+            self._size = size
+            self._tables = arena_tables(size)
+            self._empty_flags = bytes(size * size)
+            self._empty_pathlength = array('h', [-1]) * (size * size)
+            self.blocked = bytearray(self._empty_flags)
+            self.visited_idealness = bytearray(self._empty_flags)
+            self.visited_validate = bytearray(self._empty_flags)
+            self.pathlength = array('h', self._empty_pathlength)
+        else:
+            self.blocked[:] = self._empty_flags
+            self.visited_idealness[:] = self._empty_flags
+            self.visited_validate[:] = self._empty_flags
+            self.pathlength[:] = self._empty_pathlength
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,191 +318,351 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
-        self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
-
-    def _idealness_search(self, start, end_points):
-        """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
-        The edge if it is available, or the best self destruct location otherwise
-        """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
-
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
+        return self.navigate_batch([start_point], end_points, game_state)[0]
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+    def navigate_batch(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
 
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
-                    most_ideal = neighbor
+        The walls are filled in once for the whole batch. Every 'pocket' of connected pathable space
+        is searched and validated once, no matter how many of the start points lie inside it,
+        so this is much cheaper than calling navigate_multiple_endpoints for each start point.
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+        Args:
+            * start_points: A list of starting locations
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
 
-        return most_ideal
+        Returns:
+            A list with, for each start point in order, the path navigate_multiple_endpoints would return
+            for it. The entry is None if the start point is blocked by a structure or off the board.
 
-    def _get_neighbors(self, location):
-        """Get the locations adjacent to a location
         """
-        x, y = location
-        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+        layout = self._check_cache(game_state)
+        end_key = tuple(map(tuple, end_points))
+
+        paths = [None] * len(start_points)
+        pending = []
+        for index, start_point in enumerate(start_points):
+            if game_state.contains_stationary_unit(start_point) or not game_state.game_map.in_arena_bounds(start_point):
+                continue
+            key = (start_point[0], start_point[1], end_key)
+            if key in self._path_cache:
+                paths[index] = self._path_cache[key]
+            else:
+                pending.append((index, key))
 
-    def _get_direction_from_endpoints(self, end_points):
-        """Prints a message to the games debug output
+        if pending:
+            tables = arena_tables(game_state.ARENA_SIZE)
+            target = _target_tables(tables, end_key)
+            if end_key in tables.edges:
+                pathlength = self.distance_field(game_state, tables.edges.index(end_key)).pathlength
+            else:
+                self._prepare_search(game_state, layout)
+                pathlength = self.pathlength
+            #Do pathfinding, once per pocket. A validated start shares its pocket with an earlier one
+            for index, key in pending:
+                start_point = start_points[index]
+                start_index = int(start_point[0]) * self._size + int(start_point[1])
+                if pathlength[start_index] == -1:
+                    ideal_index, _ = self._idealness_search(start_index, target)
+                    self._validate(ideal_index, target)
+                path = self._get_path(start_point, start_index, pathlength, target[2])
+                self._path_cache[key] = path
+                paths[index] = path
+
+        return [[list(location) for location in path] if path is not None else None for path in paths]
+
+    def distance_field(self, game_state, target_edge):
+        """Finds the validated pathlength of every location towards an edge at once
+
+        A single breadth first search from the edge covers every location that can reach it.
+        Each remaining pocket of pathable space is searched once more from its self destruct location.
+        Reading a pathlength from the result is then O(1), instead of finding a full path per start location.
 
         Args:
-            * end_points: A set of endpoints, should be an edge 
+            * game_state: The current game state
+            * target_edge: The edge units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
 
         Returns:
-            A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
+            A DistanceField. It is cached until the structure layout changes, so do not modify it.
 
         """
-        point = end_points[0]
-        x, y = point
-        direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
-           direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
-            direction[1] = -1
-        return direction
-
-    def _get_idealness(self, location, end_points):
-        """Get the idealness of a tile, the reachable tile the unit most wants to path to.
-        Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
+        layout = self._check_cache(game_state)
+        field = self._field_cache.get(target_edge)
+        if field is not None:
+            return field
+
+        if self._previous_fields is not None:
+            previous_layout, previous_fields = self._previous_fields
+            changed = layout ^ previous_layout
+            if target_edge in previous_fields and bin(changed).count("1") <= _MAX_REPAIRED_LOCATIONS:
+                field = self._repair_field(game_state, previous_fields[target_edge], previous_layout, layout)
+                self._field_cache[target_edge] = field
+                return field
+
+        field = self._search_field(game_state, layout, target_edge)
+        self._field_cache[target_edge] = field
+        return field
+
+    def distance_fields(self, game_state, target_edges):
+        """Finds the validated pathlength of every location towards several edges, like distance_field for each
+
+        If all four edges are asked for, none of them is cached and they cannot be repaired from the previous layout,
+        they are computed together in one NumPy sweep when NumPy is installed and use_numpy is set.
+
+        Args:
+            * game_state: The current game state
+            * target_edges: A list of edges. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
 
         Returns:
-            A location the unit will attempt to reach
+            A list with the DistanceField of each edge, in order. They are cached, so do not modify them.
+
+        """
+        layout = self._check_cache(game_state)
+        missing = set(target_edges) - set(self._field_cache)
+        if self.use_numpy and numpy is not None and len(missing) == 4:
+            repairable = self._previous_fields is not None and \
+                bin(layout ^ self._previous_fields[0]).count("1") <= _MAX_REPAIRED_LOCATIONS
+            if not repairable:
+                for edge, field in enumerate(self._wavefront_fields(game_state, layout)):
+                    self._field_cache[edge] = field
+        return [self.distance_field(game_state, target_edge) for target_edge in target_edges]
+
+    def _search_field(self, game_state, layout, target_edge):
+        """Finds the distance field towards one edge from scratch, with one search from the edge and one per pocket
+        """
+        self._prepare_search(game_state, layout)
+        tables = self._tables
+        target = _target_tables(tables, tables.edges[target_edge])
+        targets = array('h', [-1]) * len(self.pathlength)
+
+        if target[0]:
+            self._validate(target[0][0], target)
+        for index in range(len(self.pathlength)):
+            if tables.in_bounds[index] and not self.blocked[index] and not self.visited_validate[index]:
+                ideal_index, pocket = self._idealness_search(index, target)
+                self._validate(ideal_index, target)
+                for pocket_index in pocket:
+                    targets[pocket_index] = ideal_index
+
+        return DistanceField(target_edge, self._size, array('h', self.pathlength), targets)
+
+    def _wavefront_fields(self, game_state, layout):
+        """Finds the distance fields towards all four edges at once with NumPy.
+        Each step grows the frontier of every edge by one location, then pockets are solved as in _FieldRepair
+        """
+        self._prepare_search(game_state, layout)
+        tables = self._tables
+        size = self._size
+        width = size + 2
+        in_bounds, edge_masks = _wavefront_masks(tables)
+
+        #The board is padded by one off-board location on every side, so neighbors are plain shifts of the flat masks
+        open_mask = in_bounds.copy()
+        blocked = numpy.frombuffer(bytes(self.blocked), dtype=numpy.uint8).reshape(size, size)
+        open_mask.reshape(width, width)[1:-1, 1:-1] &= blocked == 0
+        frontier = edge_masks & open_mask
+        unreached = open_mask & ~frontier
+        pathlength = numpy.zeros(frontier.shape, dtype=numpy.int16)
+        spread = numpy.zeros(frontier.shape, dtype=bool)
+        while True:
+            spread[:, width:-width] = frontier[:, width - 1:-width - 1] | frontier[:, width + 1:-width + 1] | frontier[:, :-2 * width] | frontier[:, 2 * width:]
+            frontier = spread & unreached
+            if not frontier.any():
+                break
+            #Every location still unreached is one more step away
+            pathlength += unreached
+            unreached ^= frontier
+        pathlength[~open_mask | unreached] = -1
+        pathlength = pathlength.reshape(4, width, width)[:, 1:-1, 1:-1].reshape(4, size * size)
+        unreached = unreached.reshape(4, width, width)[:, 1:-1, 1:-1].reshape(4, size * size)
+
+        fields = []
+        for edge in range(4):
+            field_pathlength = array('h', pathlength[edge].tolist())
+            targets = array('h', [-1]) * (size * size)
+            repair = _FieldRepair(tables, edge, self.blocked, field_pathlength, targets)
+            for index in numpy.flatnonzero(unreached[edge]).tolist():
+                if field_pathlength[index] == -1:
+                    repair.solve_component(index)
+            fields.append(DistanceField(edge, size, field_pathlength, targets))
+        return fields
+
+    def fork(self):
+        """Creates a pathfinder for a forked game state, starting with the same cached paths and distance fields
+        """
+        child = type(self)()
+        child.use_numpy = self.use_numpy
+        child._cache_layout = self._cache_layout
+        child._path_cache = dict(self._path_cache)
+        child._field_cache = dict(self._field_cache)
+        child._previous_fields = self._previous_fields
+        return child
+
+    def clear_cache(self):
+        """Forgets every cached path and distance field. Only needed if the map was edited without going through GameMap
+        """
+        self._cache_layout = None
+        self._path_cache = {}
+        self._field_cache = {}
+        self._previous_fields = None
+
+    def _check_cache(self, game_state):
+        """Clears the caches if the structure layout changed since they were filled, and returns the current layout.
+        The latest distance fields are kept aside so they can be repaired for the new layout
+        """
+        layout = game_state.game_map.structure_layout_key()
+        if layout != self._cache_layout:
+            previous_fields = (self._cache_layout, self._field_cache) if self._field_cache else self._previous_fields
+            self.clear_cache()
+            self._previous_fields = previous_fields
+            self._cache_layout = layout
+        return layout
+
+    def _repair_field(self, game_state, field, previous_layout, layout):
+        """Builds the distance field for layout from one computed for previous_layout, one changed location at a time
+        """
+        self._prepare_search(game_state, previous_layout)
+        repair = _FieldRepair(self._tables, field.target_edge, self.blocked, array('h', field.pathlength), array('h', field.targets))
+        changed = layout ^ previous_layout
+        while changed:
+            lowest_bit = changed & -changed
+            changed ^= lowest_bit
+            if layout & lowest_bit:
+                repair.block(lowest_bit.bit_length() - 1)
+            else:
+                repair.free(lowest_bit.bit_length() - 1)
+        return DistanceField(field.target_edge, self._size, repair.pathlength, repair.targets)
+
+    def _prepare_search(self, game_state, layout):
+        """Resets the grids and fills in the walls, one per set bit of the layout
         """
-        if location in end_points:
-            return sys.maxsize
+        self.initialize_map(game_state)
+        while layout:
+            lowest_bit = layout & -layout
+            self.blocked[lowest_bit.bit_length() - 1] = 1
+            layout ^= lowest_bit
 
-        direction = self._get_direction_from_endpoints(end_points)
+    def _idealness_search(self, start_index, target):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space. 
+        The edge if it is available, or the best self destruct location otherwise.
+        Returns that tile's index and the list of indices in the pocket
+        """
+        neighbors = self._tables.neighbors
+        blocked = self.blocked
+        visited = self.visited_idealness
+        idealness = target[1]
+
+        #The queue is never popped, so once the search is done it lists the whole pocket
+        pocket = [start_index]
+        best_idealness = idealness[start_index]
+        visited[start_index] = 1
+        most_ideal = start_index
+
+        for search_index in pocket:
+            for neighbor in neighbors[search_index]:
+                if blocked[neighbor]:
+                    continue
 
-        idealness = 0
-        if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
-        if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
+                if idealness[neighbor] > best_idealness:
+                    best_idealness = idealness[neighbor]
+                    most_ideal = neighbor
+
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    pocket.append(neighbor)
 
-        return idealness
+        return most_ideal, pocket
 
-    def _validate(self, ideal_tile, end_points):
+    def _validate(self, ideal_index, target):
         """Breadth first search of the grid, setting the pathlengths of each node
 
         """
         #VALDIATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+        neighbors = self._tables.neighbors
+        blocked = self.blocked
+        visited = self.visited_validate
+        pathlength = self.pathlength
+
+        end_indices = target[0]
+        seeds = end_indices if ideal_index in end_indices else (ideal_index,)
+        current = deque()
+        for index in seeds:
+            if not blocked[index]:
+                #Set current pathlength to 0
+                pathlength[index] = 0
+                visited[index] = 1
+                current.append(index)
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
-
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
-
-    def _get_path(self, start_point, end_points):
+        while current:
+            current_index = current.popleft()
+            next_pathlength = pathlength[current_index] + 1
+            for neighbor in neighbors[current_index]:
+                if not blocked[neighbor] and not visited[neighbor]:
+                    pathlength[neighbor] = next_pathlength
+                    visited[neighbor] = 1
+                    current.append(neighbor)
+
+    def _get_path(self, start_point, start_index, pathlength, direction):
         """Once all nodes are validated, and a target is found, the unit can path to its target
 
         """
         #GET THE PATH
-        path = [start_point]
-        current = start_point
+        # Paths are cached, so keep a copy of the start rather than the caller's list
+        path = [[int(start_point[0]), int(start_point[1])]]
+        current = start_index
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
+        while not pathlength[current] == 0:
+            next_move = self._choose_next_move(current, move_direction, direction, pathlength)
 
-            if current[0] == next_move[0]:
+            if current // self._size == next_move // self._size:
                 move_direction = self.VERTICAL
             else:
                 move_direction = self.HORIZONTAL
-            path.append(next_move)
+            path.append(list(divmod(next_move, self._size)))
             current = next_move
-        
-        #debug_write(path)
+
         return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
-        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
+
+    def _choose_next_move(self, current_index, previous_move_direction, direction, pathlength):
+        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take.
+        Blocked locations have no pathlength, and every open neighbor is in the same pocket so has one
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
-
-        ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        size = self._size
+        current_point = divmod(current_index, size)
+
+        ideal_neighbor = current_index
+        ideal_point = current_point
+        best_pathlength = pathlength[current_index]
+        for neighbor in self._tables.neighbors[current_index]:
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength == -1:
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
                 continue
             elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
                 new_best = True
 
             #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+            neighbor_point = divmod(neighbor, size)
+            if not new_best and not self._better_direction(current_point, neighbor_point, ideal_point, previous_move_direction, direction):
                 continue
 
             ideal_neighbor = neighbor
+            ideal_point = neighbor_point
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
         return ideal_neighbor
 
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
         """Compare two tiles and return True if the unit would rather move to the new one
 
         """
@@ -274,7 +684,6 @@ class ShortestPathFinder:
             return True
         
         #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
         if new_tile[1] == prev_best[1]: #If they both moved horizontal...
             if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
                 return True 
@@ -297,11 +706,12 @@ class ShortestPathFinder:
             debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
             return
 
-        for y in range(28):
-            for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+        size = self._size
+        for y in range(size):
+            for x in range(size):
+                index = x * size + (size - y - 1)
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
@@ -314,3 +724,112 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+def _bitboard_masks(tables):
+    """Gets the bitboards used by BitboardPathFinder. Bit x * ARENA_SIZE + y stands for location [x, y], like in
+    GameMap.structure_layout_key.
+
+    Returns:
+        A tuple (in_bounds, not_bottom_row, not_top_row, edges). in_bounds has a bit for every location on the board,
+        not_bottom_row and not_top_row clear the locations with y 0 and y ARENA_SIZE - 1, and edges has a bitboard per edge
+
+    """
+    masks = _BITBOARD_MASKS.get(tables.arena_size)
+    if masks is not None:
+        return masks
+
+    size = tables.arena_size
+    in_bounds = 0
+    bottom_row = 0
+    for x in range(size):
+        bottom_row |= 1 << (x * size)
+        for y in range(size):
+            if tables.in_bounds[x * size + y]:
+                in_bounds |= 1 << (x * size + y)
+    all_locations = (1 << (size * size)) - 1
+    edges = tuple(sum(1 << index for index in edge_indices) for edge_indices in tables.edge_indices)
+
+    masks = (in_bounds, all_locations ^ bottom_row, all_locations ^ (bottom_row << (size - 1)), edges)
+    _BITBOARD_MASKS[size] = masks
+    return masks
+
+class BitboardPathFinder(ShortestPathFinder):
+    """Finds the same paths as ShortestPathFinder, but searches the board with bitboards
+
+    The whole board fits in one Python integer, one bit per location. A breadth first step then takes a few
+    shifts and masks for every location on the frontier at once, instead of checking neighbors one location
+    at a time, which is where ShortestPathFinder spends most of its time on boards with many structures.
+    Pockets are found the same way, by growing a bitboard until it stops changing.
+
+    Only computing a distance field from scratch differs. Caching, repairing fields after small changes and
+    path extraction, including its tie-breaking, are inherited. To use it, replace the pathfinder of a game state:
+    game_state._shortest_path_finder = BitboardPathFinder()
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.use_numpy = False
+
+    def _search_field(self, game_state, layout, target_edge):
+        """Finds the distance field towards one edge from scratch, one bitboard per breadth first step
+        """
+        self.initialize_map(game_state)
+        tables = self._tables
+        size = self._size
+        in_bounds, not_bottom_row, not_top_row, edges = _bitboard_masks(tables)
+        idealness = _target_tables(tables, tables.edges[target_edge])[1]
+        pathlength = array('h', self._empty_pathlength)
+        targets = array('h', [-1]) * (size * size)
+
+        open_bits = in_bounds & ~layout
+        reached = self._fill_steps(edges[target_edge] & open_bits, open_bits, pathlength)
+
+        #Every location left over is in a pocket, which paths to its most ideal location
+        pockets = open_bits & ~reached
+        while pockets:
+            pocket = pockets & -pockets
+            while True:
+                grown = (pocket | (pocket << 1) & not_bottom_row | (pocket >> 1) & not_top_row | pocket << size | pocket >> size) & pockets
+                if grown == pocket:
+                    break
+                pocket = grown
+            pockets ^= pocket
+
+            pocket_indices = list(self._bit_indices(pocket))
+            ideal_index = max(pocket_indices, key=idealness.__getitem__)
+            if len(pocket_indices) == 1:
+                pathlength[ideal_index] = 0
+            else:
+                self._fill_steps(1 << ideal_index, pocket, pathlength)
+            for index in pocket_indices:
+                targets[index] = ideal_index
+
+        return DistanceField(target_edge, size, pathlength, targets)
+
+    def _fill_steps(self, frontier, open_bits, pathlength):
+        """Runs a breadth first search from the frontier bitboard through open_bits, and writes the step each
+        location is reached at into pathlength. Returns the bitboard of every reached location
+        """
+        size = self._size
+        _, not_bottom_row, not_top_row, _ = _bitboard_masks(self._tables)
+        reached = frontier
+        step = 0
+        while frontier:
+            bits = frontier
+            while bits:
+                lowest_bit = bits & -bits
+                pathlength[lowest_bit.bit_length() - 1] = step
+                bits ^= lowest_bit
+            frontier = ((frontier << 1) & not_bottom_row | (frontier >> 1) & not_top_row | frontier << size | frontier >> size) & open_bits & ~reached
+            reached |= frontier
+            step += 1
+        return reached
+
+    def _bit_indices(self, bits):
+        """Yields the index of every set bit, lowest first
+        """
+        while bits:
+            lowest_bit = bits & -bits
+            yield lowest_bit.bit_length() - 1
+            bits ^= lowest_bit
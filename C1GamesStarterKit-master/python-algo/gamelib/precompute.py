@@ -0,0 +1,109 @@
+import time
+import threading
+
+from .game_state import GameState
+from .util import debug_write
+
+
+class PrecomputeWorker:
+    """Runs a task on the latest board of the action phase in a background thread, so the next turn starts warm.
+
+    While the action phase streams, the algo mostly waits for the next frame. AlgoCore hands every action frame
+    to submit, and the worker builds a GameState from the latest one it has not handled yet and runs the task on it,
+    for example computing distance fields and the threat map, or candidate build plans. Frames that arrive while the
+    task runs replace each other, so the worker always moves on to the newest board. Units that died or scored
+    are already gone from the frame, so the board is the one the next turn will most likely start from.
+
+    At the start of the next turn, pause waits for the running task to finish, so it does not compete with on_turn,
+    and gives back the result of the last task that finished. See GameState.warm_start to reuse its caches.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * task (function): Called with each GameState the worker builds, its return value is kept with it
+        * tasks_finished (int): How many times the task ran to the end
+        * busy_time (float): The seconds spent building game states and running the task
+
+    """
+    def __init__(self, config, task):
+        """Starts the worker thread, which waits for frames
+
+        Args:
+            config (JSON): Contains information about the game
+            task (function): Called with each GameState the worker builds
+
+        """
+        self.config = config
+        self.task = task
+        self.tasks_finished = 0
+        self.busy_time = 0.0
+        self.__condition = threading.Condition()
+        self.__pending = None
+        self.__busy = False
+        self.__stopped = False
+        self.__result = (None, None)
+        self.__thread = threading.Thread(target=self.__run, name="gamelib-precompute", daemon=True)
+        self.__thread.start()
+
+    def submit(self, game_state_string):
+        """Hands the worker a newer board, replacing any board it has not started on yet
+
+        Args:
+            game_state_string: An action frame or turn message from the game engine, or the dict it decodes to
+
+        """
+        with self.__condition:
+            self.__pending = game_state_string
+            self.__condition.notify_all()
+
+    def pause(self):
+        """Drops any board the worker has not started on, and waits for the running task to finish
+
+        Returns:
+            A tuple (game_state, value) of the last board the task finished on and what the task returned, or (None, None)
+
+        """
+        with self.__condition:
+            self.__pending = None
+            while self.__busy:
+                self.__condition.wait()
+            return self.__result
+
+    def result(self):
+        """Gets the (game_state, value) of the last board the task finished on, without waiting, or (None, None)
+        """
+        return self.__result
+
+    def stop(self):
+        """Stops the worker thread once the running task is done
+        """
+        with self.__condition:
+            self.__stopped = True
+            self.__pending = None
+            self.__condition.notify_all()
+        self.__thread.join()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__pending is None and not self.__stopped:
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                game_state_string = self.__pending
+                self.__pending = None
+                self.__busy = True
+            result = None
+            start_time = time.perf_counter()
+            try:
+                game_state = GameState(self.config, game_state_string)
+                game_state.suppress_warnings(True)
+                result = (game_state, self.task(game_state))
+            except Exception as e:
+                debug_write("Precompute task failed: {}".format(repr(e)))
+            with self.__condition:
+                self.busy_time += time.perf_counter() - start_time
+                if result is not None:
+                    self.__result = result
+                    self.tasks_finished += 1
+                self.__busy = False
+                self.__condition.notify_all()
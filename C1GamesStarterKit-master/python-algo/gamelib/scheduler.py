@@ -0,0 +1,186 @@
+import time
+import threading
+
+from .util import debug_write, send_command
+
+
+class _Stage:
+    def __init__(self, name, plan, priority, max_depth):
+        self.name = name
+        self.plan = plan
+        self.priority = priority
+        self.max_depth = max_depth
+        # The seconds the latest run at each depth took
+        self.durations = {}
+
+    def predict(self, depth, growth):
+        """Guesses how long a run at depth takes, from the latest run at that depth or else the deepest one below
+        """
+        if depth in self.durations:
+            return self.durations[depth]
+        shallower = [known for known in self.durations if known < depth]
+        if not shallower:
+            return 0.0
+        known = max(shallower)
+        return self.durations[known] * growth ** (depth - known)
+
+
+class TurnScheduler:
+    """Runs planning stages against a time budget, and always submits the best plan found before the budget runs out.
+
+    The engine penalises slow turns, and reports how long each of ours took as game_state.my_time.
+    Register stages with add_stage, then call run(game_state) in on_turn instead of submit_turn:
+
+        scheduler = gamelib.TurnScheduler(budget=1.5, fallback=self.build_defences)
+        scheduler.add_stage("walls", self.plan_walls, priority=2)
+        scheduler.add_stage("attack", self.plan_attack, priority=1)
+        scheduler.run(game_state)
+
+    Each stage is called as stage(game_state, depth) on a fork of the game state. It makes its plan with attempt_spawn,
+    attempt_upgrade and attempt_remove on that fork, and returns a score, higher is better, or None if it found nothing.
+    The fallback is a cheap stage that runs first, without a depth, so there is always a plan. Then the stages run by
+    priority with depth 1, then again with depth 2, and so on, and the fork with the best score is submitted.
+
+    A stage is skipped at a depth when it is not expected to fit in the remaining budget: the time of its latest run at
+    that depth, from this turn or an earlier one, or else its time at the deepest depth below, times growth for each
+    depth in between. If a stage runs past the budget anyway, a timer submits the best plan so far on time,
+    and run returns once the stage is done.
+    Long stages should check time_left() and return early. A stage that raises is reported with debug_write and scores None,
+    and a fallback that raises makes no plan.
+
+    Attributes :
+        * budget (float): The seconds a turn may take, from the call to run
+        * growth (float): How much longer a stage is expected to take at each depth than at the one before
+        * max_depth (int): The deepest depth to run stages at
+        * timings (list): A (name, depth, seconds, score) tuple for every stage run, across turns, to tune budgets with
+        * reported_times (list): The game_state.my_time of each turn run was called for, the engine's measure of the previous turn
+
+    """
+    def __init__(self, budget, fallback=None, growth=2.0, max_depth=8):
+        """Creates a scheduler without stages
+
+        Args:
+            budget: The seconds a turn may take
+            fallback: A cheap stage that always makes a valid plan, called as fallback(game_state) before any other stage
+            growth: How much longer a stage is expected to take at each depth than at the one before
+            max_depth: The deepest depth to run stages at
+
+        """
+        self.budget = budget
+        self.fallback = fallback
+        self.growth = growth
+        self.max_depth = max_depth
+        self.timings = []
+        self.reported_times = []
+        self.__stages = []
+        self.__deadline = 0.0
+        self.__lock = threading.Lock()
+        self.__best = None
+        self.__submitted = True
+
+    def add_stage(self, name, stage, priority=0, max_depth=None):
+        """Registers a planning stage
+
+        Args:
+            name: The name of the stage in timings
+            stage: A function called as stage(game_state, depth) on a fork, returning a score or None
+            priority: Stages with a higher priority run first at each depth
+            max_depth: The deepest depth to run this stage at, the scheduler's max_depth if None
+
+        """
+        self.__stages.append(_Stage(name, stage, priority, max_depth if max_depth is not None else self.max_depth))
+        self.__stages.sort(key=lambda registered: -registered.priority)
+
+    def time_left(self):
+        """Gets the seconds left in the budget of the turn being planned
+        """
+        return self.__deadline - time.perf_counter()
+
+    def run(self, game_state):
+        """Plans the turn with the registered stages and submits the best plan
+
+        Args:
+            game_state: The GameState of the turn, it is not changed
+
+        Returns:
+            The forked GameState whose plan was submitted, or None if no stage made a plan
+
+        """
+        start_time = time.perf_counter()
+        self.__deadline = start_time + self.budget
+        self.reported_times.append(game_state.my_time)
+        with self.__lock:
+            self.__best = None
+            self.__submitted = False
+        timer = threading.Timer(self.budget, self.__submit)
+        timer.daemon = True
+        timer.start()
+        try:
+            if self.fallback is not None:
+                fallback_state = game_state.fork()
+                try:
+                    self.fallback(fallback_state)
+                    self.__offer(fallback_state, float("-inf"))
+                except Exception as e:
+                    debug_write("Fallback failed: {}".format(repr(e)))
+                self.timings.append(("fallback", 0, time.perf_counter() - start_time, None))
+
+            for depth in range(1, self.max_depth + 1):
+                ran = False
+                for stage in self.__stages:
+                    if self.__is_submitted():
+                        break
+                    if depth > stage.max_depth or stage.predict(depth, self.growth) > self.time_left():
+                        continue
+                    ran = True
+                    stage_state = game_state.fork()
+                    stage_start = time.perf_counter()
+                    try:
+                        score = stage.plan(stage_state, depth)
+                    except Exception as e:
+                        debug_write("Stage {} failed at depth {}: {}".format(stage.name, depth, repr(e)))
+                        score = None
+                    duration = time.perf_counter() - stage_start
+                    stage.durations[depth] = duration
+                    self.timings.append((stage.name, depth, duration, score))
+                    if score is not None:
+                        self.__offer(stage_state, score)
+                if not ran:
+                    break
+        finally:
+            timer.cancel()
+            self.__submit()
+        return self.__best[1] if self.__best is not None else None
+
+    def report(self):
+        """Prints the mean time of each stage at each depth with debug_write
+        """
+        totals = {}
+        for name, depth, seconds, _ in self.timings:
+            total, count = totals.get((name, depth), (0.0, 0))
+            totals[name, depth] = (total + seconds, count + 1)
+        for (name, depth), (total, count) in sorted(totals.items()):
+            debug_write("{} at depth {}: {:.2f} ms over {} runs".format(name, depth, 1000 * total / count, count))
+
+    def __is_submitted(self):
+        with self.__lock:
+            return self.__submitted
+
+    def __offer(self, game_state, score):
+        with self.__lock:
+            if not self.__submitted and (self.__best is None or score > self.__best[0]):
+                self.__best = (score, game_state)
+
+    def __submit(self):
+        with self.__lock:
+            if self.__submitted:
+                return
+            self.__submitted = True
+            best = self.__best
+        if best is None:
+            debug_write("No stage made a plan in time, submitting an empty turn.")
+            # An empty turn is still a valid turn
+            send_command("[]")
+            send_command("[]")
+            return
+        best[1].submit_turn()
@@ -1,7 +1,19 @@
 import unittest
+import random
 import json
+import os
+import time
 from .game_state import GameState
 from .unit import GameUnit
+from .game_map import arena_tables
+from . import navigation
+from .util import parse_json, parse_json_field, CommandReader
+from .algocore import AlgoCore
+from .precompute import PrecomputeWorker
+from .scheduler import TurnScheduler
+import io
+import copy
+import contextlib
 
 class BasicTests(unittest.TestCase):
 
@@ -192,6 +204,21 @@ class BasicTests(unittest.TestCase):
         state.suppress_warnings(True)
         return state
 
+    def breadth_first_distances(self, game, sources):
+        """Steps from the closest source to every location that can reach one, searched without gamelib's pathfinder
+        """
+        distances = {tuple(source): 0 for source in sources}
+        frontier = list(distances)
+        while frontier:
+            next_frontier = []
+            for x, y in frontier:
+                for neighbor in [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]:
+                    if neighbor not in distances and game.game_map.in_arena_bounds(list(neighbor)) and not game.contains_stationary_unit(list(neighbor)):
+                        distances[neighbor] = distances[x, y] + 1
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return distances
+
     def test_basic(self):
         self.assertEqual(True, True, "It's the end of the world as we know it, and I feel fine")
 
@@ -275,3 +302,644 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([13, 0], path[0], "Paths should begin at the start location")
+        self.assertIn(path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Path did not reach the enemy edge")
+        path.append([0, 0])
+        self.assertEqual(path[:-1], game.find_path_to_edge([13, 0]), "Cached path changed between identical queries")
+        start = [13, 0]
+        game._shortest_path_finder.clear_cache()
+        game.find_path_to_edge(start)
+        start[:] = [99, 99]
+        self.assertEqual(path[:-1], game.find_path_to_edge([13, 0]), "The cache should not keep the caller's start location")
+
+        layout = game.game_map.structure_layout_key()
+        blocker = path[1]
+        game.attempt_spawn("FF", [blocker])
+        self.assertNotEqual(layout, game.game_map.structure_layout_key(), "Spawning a structure should change the layout key")
+        self.assertNotIn(blocker, game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a new structure")
+        game.game_map.remove_unit(blocker)
+        self.assertEqual(layout, game.game_map.structure_layout_key(), "Removing the structure should restore the layout key")
+        self.assertEqual(path[:-1], game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a removed structure")
+
+    def test_batch_paths(self):
+        game = self.make_turn_0_map()
+        for location in [[12, 3], [13, 3], [14, 3], [15, 3], [10, 6], [11, 5], [16, 5], [17, 6]]:
+            game.game_map.add_unit("FF", location, 0)
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        starts.append([12, 3])
+        batch = game.find_paths_to_edge_batch(starts)
+        self.assertIsNone(batch[-1], "A blocked start location should not have a path")
+        distances = [self.breadth_first_distances(game, game.game_map.get_edge_locations(edge)) for edge in range(4)]
+        for start, path in zip(starts[:-1], batch[:-1]):
+            edge = game.get_target_edge(start)
+            self.assertEqual(distances[edge][tuple(start)], len(path) - 1, "Batched path from {} is not a shortest path".format(start))
+            self.assertIn(path[-1], game.game_map.get_edge_locations(edge))
+            for location, next_location in zip(path, path[1:]):
+                self.assertEqual(1, game.game_map.distance_between_locations(location, next_location), "Path from {} skips a step".format(start))
+                self.assertFalse(game.contains_stationary_unit(next_location), "Path from {} goes through a structure".format(start))
+
+        # Paths of the original node and queue search, which pick between equally short paths the same way
+        expected = {
+            (11, 2): [[11, 2], [11, 3], [11, 4], [12, 4], [12, 5], [13, 5], [13, 6], [14, 6], [14, 7], [15, 7], [15, 8], [16, 8], [16, 9], [17, 9], [17, 10],
+                [18, 10], [18, 11], [19, 11], [19, 12], [20, 12], [20, 13], [21, 13], [21, 14], [22, 14], [22, 15], [23, 15], [23, 16], [24, 16], [24, 17]],
+            (14, 0): [[14, 0], [14, 1], [13, 1], [13, 2], [12, 2], [11, 2], [11, 3], [10, 3], [10, 4], [9, 4], [9, 5], [8, 5], [8, 6], [7, 6], [7, 7],
+                [6, 7], [6, 8], [5, 8], [5, 9], [4, 9], [4, 10], [3, 10], [3, 11], [2, 11], [2, 12], [1, 12], [1, 13], [0, 13], [0, 14]],
+            (17, 3): [[17, 3], [17, 4], [16, 4], [15, 4], [15, 5], [14, 5], [14, 6], [13, 6], [13, 7], [12, 7], [12, 8], [11, 8], [11, 9], [10, 9], [10, 10],
+                [9, 10], [9, 11], [8, 11], [8, 12], [7, 12], [7, 13], [6, 13], [6, 14], [5, 14], [5, 15], [4, 15], [4, 16], [3, 16], [3, 17]],
+        }
+        for start, path in zip(starts, batch):
+            if tuple(start) in expected:
+                self.assertEqual(expected[tuple(start)], path, "Batched path from {} differs from the original search".format(start))
+
+    def test_pathfinder_reuses_grids(self):
+        game = self.make_turn_0_map()
+        finder = game._shortest_path_finder
+        game.find_path_to_edge([13, 0])
+        grids = [finder.blocked, finder.visited_idealness, finder.visited_validate, finder.pathlength]
+        game.attempt_spawn("FF", [[13, 1]])
+        game.find_path_to_edge([13, 0])
+        self.assertEqual(1, finder.blocked[13 * game.ARENA_SIZE + 1], "New structure was not filled in")
+        for before, after in zip(grids, [finder.blocked, finder.visited_idealness, finder.visited_validate, finder.pathlength]):
+            self.assertIs(before, after, "Pathfinding grids should be reset, not reallocated")
+
+    def test_arena_tables(self):
+        game = self.make_turn_0_map()
+        tables = arena_tables(game.ARENA_SIZE)
+        self.assertIs(tables, game.game_map._tables, "Arena tables should be shared")
+        self.assertEqual(420, sum(tables.in_bounds), "The diamond should have 420 locations")
+        self.assertEqual((13 * 28 + 1, 14 * 28 + 0), tables.neighbors[13 * 28 + 0], "Neighbors should stay on the board")
+        self.assertEqual((), tables.neighbors[0], "Off-board locations should have no neighbors")
+        edges = game.game_map.get_edges()
+        for edge, locations in enumerate(tables.edges):
+            self.assertEqual(edges[edge], [list(location) for location in locations], "Edge {} does not match get_edges".format(edge))
+
+    def test_distance_field(self):
+        game = self.make_turn_0_map()
+        for x in range(9, 19):
+            game.game_map.add_unit("FF", [x, 16], 1)
+        for x in range(3, 25):
+            game.game_map.add_unit("FF", [x, 10], 0)
+        field = game.get_distance_field(game.game_map.TOP_RIGHT)
+        self.assertIs(field, game.get_distance_field(game.game_map.TOP_RIGHT), "Distance fields should be cached")
+        self.assertEqual(-1, field.get_pathlength([3, 10]), "Blocked locations have no pathlength")
+        # Row 10 is walled off, so the bottom of the board is a pocket whose units self destruct at its top right corner
+        above = self.breadth_first_distances(game, game.game_map.get_edge_locations(game.game_map.TOP_RIGHT))
+        below = self.breadth_first_distances(game, [[23, 9]])
+        for location in game.game_map:
+            if game.contains_stationary_unit(location):
+                continue
+            if location[1] > 10:
+                self.assertEqual(above[tuple(location)], field.get_pathlength(location), "Wrong pathlength at {}".format(location))
+                self.assertTrue(field.reaches_edge(location))
+                self.assertIsNone(field.get_target(location))
+            else:
+                self.assertEqual(below[tuple(location)], field.get_pathlength(location), "Wrong pathlength at {}".format(location))
+                self.assertFalse(field.reaches_edge(location))
+                self.assertEqual([23, 9], field.get_target(location), "Wrong self destruct target at {}".format(location))
+
+    def test_distance_field_repair(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        finder = game._shortest_path_finder
+        locations = [location for location in game_map if location[1] in (9, 10, 13, 14, 17)]
+        rng = random.Random(7)
+        for location in rng.sample(locations, 60):
+            game_map.add_unit("FF", location, 0)
+        for _ in range(40):
+            fields = [game.get_distance_field(edge) for edge in range(4)]
+            for location in rng.sample(locations, rng.randint(1, 4)):
+                if game_map[location]:
+                    game_map.remove_unit(location)
+                else:
+                    game_map.add_unit("FF", location, 0)
+            repaired = [game.get_distance_field(edge) for edge in range(4)]
+            for old_field, new_field in zip(fields, repaired):
+                self.assertIsNot(old_field, new_field, "Fields should not be reused after the layout changed")
+            finder.clear_cache()
+            for edge, field in enumerate(repaired):
+                expected = game.get_distance_field(edge)
+                self.assertEqual(list(expected.pathlength), list(field.pathlength), "Repaired pathlengths differ")
+                self.assertEqual(list(expected.targets), list(field.targets), "Repaired targets differ")
+
+    def test_wall_effects(self):
+        game = self.make_turn_0_map()
+        for x in range(4, 24):
+            if x != 13:
+                game.game_map.add_unit("FF", [x, 17], 1)
+        game.game_map.add_unit("SI", [13, 20], 1)
+        starts = [[13, 27], [6, 20], [20, 21]]
+        candidates = [[4, 17], [13, 20], [13, 17], [13, 10], [5, 10], [0, 0]]
+        effects = game.get_wall_effects(candidates, starts)
+        self.assertEqual(len(candidates), len(effects))
+        self.assertIsNone(effects[0], "A location holding a structure is not a candidate")
+        self.assertIsNone(effects[-1], "A location outside the arena is not a candidate")
+        self.assertEqual(1, len(game.game_map[13, 20]), "Units at a candidate location should be restored")
+        current = [(len(path) - 1, path[-1]) for path in game.find_paths_to_edge_batch(starts)]
+        self.assertEqual(current, effects[4], "A candidate on no path should not change anything")
+        self.assertNotEqual(current, effects[2], "Closing the gap should change the paths")
+        for candidate, effect in zip(candidates[1:-1], effects[1:-1]):
+            game.game_map.add_unit("FF", candidate, 0)
+            for start, start_effect in zip(starts, effect):
+                game._shortest_path_finder.clear_cache()
+                path = game.find_path_to_edge(start)
+                self.assertEqual((len(path) - 1, path[-1]), start_effect, "Wrong effect of {} on {}".format(candidate, start))
+            game.game_map.remove_unit(candidate)
+
+    @unittest.skipIf(navigation.numpy is None, "NumPy is not installed")
+    def test_wavefront_fields(self):
+        game = self.make_turn_0_map()
+        rng = random.Random(3)
+        for location in game.game_map:
+            if rng.random() < 0.3:
+                game.game_map.add_unit("FF", location, 0)
+        finder = game._shortest_path_finder
+        game.get_distance_field(0)
+        self.assertEqual([0], list(finder._field_cache), "A single edge should be searched on its own")
+        finder.clear_cache()
+        fields = game.get_distance_fields(range(4))
+        finder.clear_cache()
+        finder.use_numpy = False
+        for field in fields:
+            expected = game.get_distance_field(field.target_edge)
+            self.assertEqual(list(expected.pathlength), list(field.pathlength), "NumPy pathlengths differ")
+            self.assertEqual(list(expected.targets), list(field.targets), "NumPy targets differ")
+
+    def test_bitboard_pathfinder(self):
+        rng = random.Random(11)
+        for density in [0.1, 0.3, 0.5]:
+            game = self.make_turn_0_map()
+            for location in game.game_map:
+                if rng.random() < density:
+                    game.game_map.add_unit("FF", location, 0)
+            finder = navigation.ShortestPathFinder()
+            finder.use_numpy = False
+            bitboard_finder = navigation.BitboardPathFinder()
+            for edge in range(4):
+                expected = finder.distance_field(game, edge)
+                field = bitboard_finder.distance_field(game, edge)
+                self.assertEqual(list(expected.pathlength), list(field.pathlength), "Bitboard pathlengths differ")
+                self.assertEqual(list(expected.targets), list(field.targets), "Bitboard targets differ")
+            starts = [location for location in game.game_map if not game.contains_stationary_unit(location)][::7]
+            end_points = game.game_map.get_edge_locations(game.game_map.TOP_LEFT)
+            self.assertEqual(finder.navigate_batch(starts, end_points, game), bitboard_finder.navigate_batch(starts, end_points, game))
+
+    def test_occupancy_layers(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        size = game.ARENA_SIZE
+
+        def at(layer, x, y):
+            return layer[x, y] if navigation.numpy is not None else layer[x * size + y]
+
+        def total(layer):
+            return layer.sum() if navigation.numpy is not None else sum(layer)
+
+        game_map.add_unit("DF", [13, 13], 0)
+        game_map.add_unit("DF", [14, 20], 1)
+        game_map.add_unit("PI", [14, 20], 1)
+        game_map.add_unit("PI", [14, 20], 1)
+        game.attempt_upgrade([13, 13])
+        self.assertEqual(1, at(game_map.get_count_layer("DF", 0), 13, 13))
+        self.assertEqual(0, at(game_map.get_count_layer("DF", 1), 13, 13))
+        self.assertEqual(2, at(game_map.get_count_layer("PI", 1), 14, 20))
+        self.assertEqual(sum(unit.health for unit in game_map[14, 20]), at(game_map.get_health_layer(1), 14, 20))
+        self.assertEqual(1, at(game_map.get_upgraded_layer(), 13, 13))
+
+        game_map.remove_unit([14, 20])
+        game_map[13, 13] = []
+        for player_index in range(2):
+            self.assertEqual(0, total(game_map.get_health_layer(player_index)), "Removed units should leave the layers")
+        self.assertEqual(0, at(game_map.get_upgraded_layer(), 13, 13))
+        self.assertIsNone(game_map.get_count_layer("RM", 0), "Only units placed on the map have layers")
+
+        def layers(game_map):
+            flat = [game_map.get_count_layer(unit_type, player_index) for unit_type in ("FF", "PI", "DF") for player_index in (0, 1)]
+            flat += [game_map.get_health_layer(player_index) for player_index in (0, 1)] + [game_map.get_upgraded_layer()]
+            flat = [layer.ravel().tolist() if navigation.numpy is not None else list(layer) for layer in flat]
+            return flat, [game_map.get_unit_locations(unit_type, player_index) for unit_type in ("FF", "PI", "DF") for player_index in (0, 1)]
+
+        frame = json.loads(game.serialized_string)
+        frame["p1Units"] += [[]] * (8 - len(frame["p1Units"]))
+        frame["p1Units"][0] = [[13, 13, 60.0, "1"], [12, 12, 60.0, "2"]]
+        frame["p1Units"][3] = [[3, 10, 15.0, "3"], [3, 10, 15.0, "4"]]
+        frame["p1Units"][7] = [[13, 13, 0.0, ""]]
+        frame["p2Units"][2] = [[14, 20, 75.0, "5"]]
+        parsed = GameState(game.config, json.dumps(frame)).game_map
+        parsed_layers = layers(parsed)
+        self.assertEqual(1, at(parsed.get_upgraded_layer(), 13, 13))
+        for location in parsed:
+            parsed[tuple(location)] = list(parsed[location])
+        self.assertEqual(layers(parsed), parsed_layers, "Parsing should build the same layers as refreshing every location")
+
+    def test_map_iteration(self):
+        game_map = self.make_turn_0_map().game_map
+        locations = list(game_map)
+        self.assertEqual(420, len(locations))
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3])
+        self.assertEqual([14, 27], locations[-1])
+        self.assertEqual(420 * 420, sum(1 for _ in game_map for _ in game_map), "Nested iterations should not interfere")
+        self.assertEqual(locations[:210], list(game_map.iterate_locations(player_index=0)))
+        self.assertEqual(locations[210:], list(game_map.iterate_locations(player_index=1)))
+        for edge in range(4):
+            edge_locations = list(game_map.iterate_locations(edge=edge))
+            self.assertCountEqual(game_map.get_edge_locations(edge), edge_locations)
+            self.assertEqual(edge_locations, [location for location in locations if location in edge_locations])
+        self.assertEqual([], list(game_map.iterate_locations(player_index=0, edge=game_map.TOP_LEFT)))
+
+    def test_range_stencils(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        get_hit_radius = game.config["unitInformation"][0]["getHitRadius"]
+        for location in [[13, 0], [3, 10], [14, 14], [24, 13]]:
+            for radius in [0, 1, 2.5, 3.5, 4.5]:
+                expected = [[x, y] for x in range(28) for y in range(28)
+                    if game_map.in_arena_bounds([x, y]) and game_map.distance_between_locations(location, [x, y]) < radius + get_hit_radius]
+                self.assertEqual(expected, game_map.get_locations_in_range(location, radius))
+                indices = game_map.get_location_indices_in_range(location, radius)
+                self.assertEqual([x * 28 + y for x, y in expected], list(indices))
+                self.assertIs(indices, game_map.get_location_indices_in_range(location, radius), "Ranges should be cached")
+
+    def test_unit_index(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        for location in [[14, 20], [10, 17], [13, 15]]:
+            game_map.add_unit("DF", location, 1)
+        game_map.add_unit("EF", [13, 5], 0)
+        game_map.add_unit("EF", [12, 6], 0)
+        game.attempt_upgrade([12, 6])
+        self.assertEqual([[13, 15], [10, 17], [14, 20]], game_map.get_unit_locations("DF", 1))
+        self.assertEqual([], game_map.get_unit_locations("DF", 0))
+        self.assertEqual([[13, 5]], game_map.get_unit_locations("EF", 0, upgraded=False))
+        self.assertEqual([[12, 6]], game_map.get_unit_locations("EF", 0, upgraded=True))
+
+        game_map.remove_unit([10, 17])
+        game_map.add_unit("FF", [14, 20], 1)
+        game_map[13, 5] = []
+        self.assertEqual([[13, 15]], game_map.get_unit_locations("DF", 1))
+        self.assertEqual([[14, 20]], game_map.get_unit_locations("FF", 1))
+        self.assertEqual([[12, 6]], game_map.get_unit_locations("EF", 0))
+        for unit_type, player_index in [("DF", 1), ("FF", 1), ("EF", 0)]:
+            expected = [location for location in game_map if any(unit.unit_type == unit_type and unit.player_index == player_index for unit in game_map[location])]
+            self.assertEqual(expected, game_map.get_unit_locations(unit_type, player_index))
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("DF", [[13, 10], [14, 10]])
+        path = game.find_path_to_edge([13, 27])
+        child = game.fork()
+        self.assertIs(game.game_map[13, 10][0], child.game_map[13, 10][0], "Unchanged units should be shared")
+        self.assertEqual(path, child.find_path_to_edge([13, 27]))
+
+        child.attempt_upgrade([13, 10])
+        child.attempt_spawn("FF", [[12, 12]])
+        child.attempt_spawn("PI", [13, 0])
+        child.game_map.remove_unit([14, 10])
+        game.game_map.add_unit("PI", [14, 0], 0)
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "Upgrading a fork should not change its parent")
+        self.assertTrue(child.game_map[13, 10][0].upgraded)
+        self.assertEqual([], game.game_map[12, 12])
+        self.assertEqual([], game.game_map[13, 0])
+        self.assertEqual([], child.game_map[14, 0])
+        self.assertTrue(game.contains_stationary_unit([14, 10]))
+        self.assertFalse(child.contains_stationary_unit([14, 10]))
+        self.assertEqual(2, len(game._build_stack))
+        self.assertEqual(4, len(child._build_stack))
+        self.assertNotEqual(game.get_resource(game.SP), child.get_resource(game.SP))
+        self.assertEqual([[13, 10], [14, 10]], game.game_map.get_unit_locations("DF", 0, upgraded=False))
+        self.assertEqual([[13, 10]], child.game_map.get_unit_locations("DF", 0, upgraded=True))
+
+        game._shortest_path_finder.clear_cache()
+        self.assertEqual(path, game.find_path_to_edge([13, 27]), "The parent's paths should not change")
+
+    def test_checkpoint_rollback(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game.attempt_spawn("DF", [[13, 10], [14, 10]])
+        game.attempt_spawn("PI", [13, 0])
+
+        def snapshot():
+            return ([(location, [(unit, unit.upgraded, unit.health) for unit in game_map[location]]) for location in game_map],
+                game.get_resources(), list(game._build_stack), list(game._deploy_stack), game_map.structure_layout_key(),
+                game_map.get_unit_locations("DF", 0), game_map.get_unit_locations("PI", 0))
+
+        before = snapshot()
+        game.checkpoint()
+        game.attempt_upgrade([13, 10])
+        game.attempt_spawn("PI", [13, 0])
+        game.attempt_remove([14, 10])
+        game.checkpoint()
+        game.attempt_spawn("FF", [[12, 12], [11, 12]])
+        game_map.remove_unit([14, 10])
+        game.commit()
+        game_map.add_unit("EF", [14, 20], 1)
+        self.assertNotEqual(before, snapshot())
+        game.rollback()
+        self.assertEqual(before, snapshot(), "Rolling back should restore the exact previous state")
+        self.assertFalse(game_map[13, 10][0].upgraded)
+
+        game.checkpoint()
+        game.attempt_spawn("FF", [12, 12])
+        game.commit()
+        self.assertTrue(game.contains_stationary_unit([12, 12]), "Committed changes should be kept")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game.attempt_spawn("DF", [[13, 10], [14, 10], [3, 10]])
+        game_map.add_unit("DF", [13, 17], 1)
+
+        def check():
+            threat_map = game_map.get_threat_map()
+            for location in game_map:
+                for player_index in (0, 1):
+                    expected = sum(unit.damage_i for unit in game.get_attackers(location, player_index))
+                    self.assertEqual(expected, threat_map.get_damage(location, player_index), "Wrong threat at {} for player {}".format(location, player_index))
+            return threat_map
+
+        threat_map = check()
+        self.assertEqual(0, threat_map.get_damage([20, 20], 1))
+        self.assertEqual(10, threat_map.get_damage([13, 11], 1), "Two turrets should both count")
+        self.assertEqual(threat_map.get_damage([13, 15], 0) * 3, threat_map.get_path_damage([[13, 15]] * 3, 0))
+
+        game.attempt_upgrade([13, 10])
+        game.attempt_remove([3, 10])
+        game_map.remove_unit([3, 10])
+        game_map.add_unit("FF", [4, 12], 0)
+        self.assertIs(threat_map, check(), "The threat map should be updated, not rebuilt")
+
+        game.checkpoint()
+        game_map.add_unit("DF", [20, 12], 0)
+        game_map.remove_unit([13, 17])
+        check()
+        game.rollback()
+        check()
+        self.assertEqual(5, threat_map.get_damage([13, 15], 0), "Rolling back should restore the enemy turret")
+
+        child = game.fork()
+        child.game_map.remove_unit([13, 10])
+        check()
+        self.assertEqual(5, child.game_map.get_threat_map().get_damage([13, 11], 1))
+        self.assertEqual(20, threat_map.get_damage([13, 11], 1), "Changing a fork should not change the parent")
+
+    def test_unit_catalog(self):
+        game = self.make_turn_0_map()
+        catalog = game.unit_catalog
+        self.assertIs(catalog, GameState(game.config, game.serialized_string).unit_catalog, "The catalog should be compiled once per config")
+        self.assertIs(catalog, game.game_map.unit_catalog)
+        self.assertEqual(("FF", "EF", "DF"), catalog.STRUCTURE_TYPES)
+        self.assertEqual(2, catalog.UNIT_TYPE_TO_INDEX["DF"])
+
+        turret = catalog.get_stats("DF")
+        upgraded = catalog.get_stats("DF", True)
+        self.assertTrue(turret.stationary)
+        self.assertEqual((2.5, 5.0), (turret.attackRange, turret.damage_i))
+        self.assertEqual((3.5, 15.0), (upgraded.attackRange, upgraded.damage_i))
+        self.assertEqual(4.5, catalog.max_attack_range)
+        self.assertEqual(game.type_cost("DF", True), catalog.type_cost("DF", True))
+        self.assertTrue(catalog.can_upgrade("DF"))
+
+        copied = copy.deepcopy(game)
+        self.assertIs(catalog, copied.unit_catalog, "Deep copies should share the read only catalog")
+        self.assertIs(catalog, copied.game_map.unit_catalog)
+        copied.game_map.add_unit("DF", [13, 13], 0)
+        self.assertIs(catalog, copied.game_map[13, 13][0]._stats.catalog, "Units should get the catalog of their map")
+        copied_catalog = GameState(copied.config, game.serialized_string).unit_catalog
+        self.assertIs(catalog, GameState(game.config, game.serialized_string).unit_catalog, "Catalogs of several configs should stay cached")
+        self.assertIs(copied_catalog, GameState(copied.config, game.serialized_string).unit_catalog)
+
+        unit = GameUnit("DF", game.config)
+        self.assertEqual((turret.max_health, list(turret.cost)), (unit.health, unit.cost))
+        unit.upgrade()
+        self.assertEqual((upgraded.attackRange, upgraded.damage_i, list(upgraded.cost)), (unit.attackRange, unit.damage_i, unit.cost))
+
+    def test_strategy_compiles_catalog(self):
+        import algo_strategy
+        game = self.make_turn_0_map()
+        with contextlib.redirect_stderr(io.StringIO()):
+            algo = algo_strategy.AlgoStrategy()
+            algo.on_game_start(game.config)
+        self.assertIs(game.config, algo.config)
+        self.assertIs(game.unit_catalog, algo.unit_catalog, "The strategy should compile the catalog at the start of the game")
+
+    def test_unit_flyweight(self):
+        game = self.make_turn_0_map()
+        first = GameUnit("DF", game.config, 0, None, 3, 12)
+        second = GameUnit("DF", game.config, 1, 20.0, 14, 20)
+        self.assertFalse(hasattr(first, "__dict__"), "Units should not carry a __dict__")
+        self.assertIs(first._stats, second._stats, "Units of the same type should share their stats")
+        self.assertEqual(("DF", 0, 3, 12, 20.0), (second.unit_type, first.player_index, first.x, first.y, second.health))
+        self.assertIs(game.config, first.config)
+
+        first.upgrade()
+        self.assertIs(first._stats, game.unit_catalog.get_stats("DF", True))
+        self.assertEqual((3.5, 2.5), (first.attackRange, second.attackRange), "Upgrading a unit should not change the others")
+        with self.assertRaises(AttributeError):
+            second.attackRange = 10
+
+        first.cost.append(1)
+        self.assertEqual(list(game.unit_catalog.get_stats("DF", True).cost), first.cost)
+        game.game_map.add_unit("DF", [3, 12], 0)
+        child = game.fork()
+        child.game_map.remove_unit([3, 12])
+        child.game_map.add_unit("DF", [3, 12], 0)
+        child.attempt_upgrade([3, 12])
+        self.assertFalse(game.game_map[3, 12][0].upgraded, "Copies of units should be independent")
+
+    def test_unit_table(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"] = [[[3, 12, 60.0, "7"], [4, 12, 60.0, "8"]], [], [[13, 10, 75.0, "9"]], [], [], [], [[4, 12, 0, "10"]], [[13, 10, 0, "11"]]]
+        state["p2Units"] = [[], [], [[14, 17, 40.0, "12"]], [[20, 20, 15.0, "13"], [20, 20, 15.0, "14"]], [], [], [], []]
+        game = GameState(game.config, json.dumps(state))
+        table = game.unit_table
+
+        self.assertEqual(6, len(table))
+        rows = [tuple(table.get_column(name)[row] for name in table.COLUMNS) for row in range(len(table))]
+        self.assertEqual([
+            (3, 12, 0, 0, 60.0, 0, 0, 7),
+            (4, 12, 0, 0, 60.0, 0, 1, 8),
+            (13, 10, 2, 0, 75.0, 1, 0, 9),
+            (14, 17, 2, 1, 40.0, 0, 0, 12),
+            (20, 20, 3, 1, 15.0, 0, 0, 13),
+            (20, 20, 3, 1, 15.0, 0, 0, 14)], rows)
+        self.assertEqual([3], table.select("DF", 1))
+        self.assertEqual([0, 1, 2], table.select(player_index=0))
+        self.assertEqual("DF", table.unit_types[table.type_id[2]])
+        for row in range(len(table)):
+            units = game.game_map[table.x[row], table.y[row]]
+            self.assertTrue(any(unit.unit_type == table.unit_types[table.type_id[row]] and unit.upgraded == table.upgraded[row] and unit.pending_removal == table.pending_removal[row] for unit in units))
+
+    def test_single_parse(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"] = [[[3, 12, 60.0, "7"]], [], [], [], [], [], [], []]
+        line = json.dumps(state)
+        self.assertIs(parse_json(line), parse_json(line), "Decoding the same message twice should reuse the first decode")
+        self.assertEqual(state, parse_json(line))
+
+        lazy = GameState(game.config, line)
+        self.assertIsNone(lazy._GameState__game_map, "The map should only be built when it is used")
+        self.assertEqual([25.0, 5.0], lazy.get_resources())
+        self.assertIsNone(lazy._GameState__game_map)
+        self.assertEqual(1, len(lazy.unit_table))
+        self.assertEqual(["FF"], [unit.unit_type for unit in lazy.game_map[3, 12]])
+
+        decoded = GameState(game.config, state)
+        self.assertTrue(decoded.contains_stationary_unit([3, 12]), "A GameState should accept the decoded state")
+        child = decoded.fork()
+        child.game_map.remove_unit([3, 12])
+        self.assertTrue(decoded.contains_stationary_unit([3, 12]))
+
+    def test_event_subscriptions(self):
+        game = self.make_turn_0_map()
+        frame = json.loads(game.serialized_string)
+        frame["turnInfo"] = [1, 0, 12]
+        frame["events"]["breach"] = [[[3, 10], 1, 3, "5", 2]]
+        frame["events"]["death"] = [[[13, 10], 2, "9", 1, False]]
+        line = json.dumps(frame)
+        self.assertEqual([1, 0, 12], parse_json_field(line, "turnInfo"))
+        self.assertEqual(frame["events"], parse_json_field(line, "events"))
+        self.assertIsNone(parse_json_field(line, "missing"))
+
+        received = []
+        algo = AlgoCore()
+        algo.subscribe("breach", lambda events: received.append(("breach", events)))
+        algo.subscribe("death", lambda events: received.append(("death", events)))
+        algo.subscribe("spawn", lambda events: received.append(("spawn", events)))
+        algo._dispatch_action_frame(line)
+        self.assertEqual([("breach", frame["events"]["breach"]), ("death", frame["events"]["death"])], received,
+            "Subscribers should only get the events they asked for, and only when there are some")
+
+        received.clear()
+        algo.unsubscribe("breach", algo._AlgoCore__subscriptions["breach"][0])
+        algo._dispatch_action_frame(line)
+        self.assertEqual(["death"], [event_type for event_type, _ in received])
+
+    def test_frame_coalescing(self):
+        game = self.make_turn_0_map()
+        frames = []
+        for frame_number in range(4):
+            frame = json.loads(game.serialized_string)
+            frame["turnInfo"] = [1, 0, frame_number]
+            frame["p1Units"][3] = [[13, frame_number, 15.0, "1"]]
+            frame["events"]["breach"] = [[[3, 10], 1, 3, str(frame_number), 2]]
+            frames.append(json.dumps(frame))
+        turn = json.loads(game.serialized_string)
+        turn["turnInfo"] = [0, 1, -1]
+        after_turn = json.loads(frames[0])
+        after_turn["turnInfo"] = [1, 1, 0]
+
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(read_fd) as stream:
+            with os.fdopen(write_fd, "w") as pipe:
+                pipe.write("\n".join(frames + [json.dumps(turn), json.dumps(after_turn)]) + "\n")
+            reader = CommandReader(stream)
+            received = []
+            algo = AlgoCore()
+            algo.subscribe("breach", received.extend)
+
+            algo.frames_received += 1
+            merged = algo._coalesce_action_frames(reader, reader.get_command())
+            algo._dispatch_action_frame(merged)
+            self.assertEqual((4, 3), (algo.frames_received, algo.frames_coalesced))
+            self.assertEqual(["0", "1", "2", "3"], [breach[3] for breach in received], "Every event of the merged frames should be kept")
+            self.assertEqual([[13, 3, 15.0, "1"]], merged["p1Units"][3], "The merged frame should have the latest units")
+            self.assertEqual([0, 1, -1], parse_json_field(reader.get_command(), "turnInfo"), "The start of a turn should never be merged")
+            self.assertEqual([1, 1, 0], parse_json_field(reader.get_command(), "turnInfo"))
+            self.assertEqual(0, reader.poll())
+
+        class FrameAlgo(AlgoCore):
+            def on_action_frame(self, action_frame_game_state):
+                received.append(action_frame_game_state)
+
+        received = []
+        FrameAlgo()._dispatch_action_frame(merged)
+        self.assertEqual(merged, json.loads(received[0]), "on_action_frame should get the merged frame as a string")
+
+    def test_precompute_worker(self):
+        game = self.make_turn_0_map()
+        frame = json.loads(game.serialized_string)
+        frame["turnInfo"] = [1, 0, 5]
+        frame["p1Units"][2] = [[13, 10, 75.0, "1"], [3, 12, 75.0, "2"]]
+        frame["p2Units"][0] = [[13, 17, 60.0, "3"]]
+        frame["p2Units"][2] = [[14, 17, 75.0, "4"]]
+
+        algo = AlgoCore()
+        worker = PrecomputeWorker(game.config, algo.precompute)
+        algo.precompute_worker = worker
+        worker.submit(json.dumps(frame))
+        for _ in range(500):
+            if worker.tasks_finished:
+                break
+            time.sleep(0.01)
+        board, _ = worker.pause()
+        self.assertEqual((1, 4), (worker.tasks_finished, len(board._shortest_path_finder._field_cache)))
+
+        turn = dict(frame, turnInfo=[0, 1, -1])
+        turn["p1Units"] = [[[13, 11, 60.0, "5"]], [], [[13, 10, 75.0, "1"]], [], [], [], [], []]
+        warm = GameState(game.config, json.dumps(turn))
+        cold = GameState(game.config, json.dumps(turn))
+        algo.warm_start(warm)
+        for edge in range(4):
+            self.assertEqual(cold.get_distance_field(edge).pathlength, warm.get_distance_field(edge).pathlength, "Warm fields should match fields computed from scratch")
+        for location in cold.game_map:
+            for player_index in (0, 1):
+                self.assertEqual(cold.game_map.get_threat_map().get_damage(location, player_index), warm.game_map.get_threat_map().get_damage(location, player_index))
+        worker.stop()
+
+    def test_turn_scheduler(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+
+        def fallback(game_state):
+            game_state.attempt_spawn("FF", [13, 0])
+
+        def walls(game_state, depth):
+            game_state.attempt_spawn("FF", [[x, 13] for x in range(depth)])
+            return depth
+
+        def slow(game_state, depth):
+            time.sleep(0.03 * depth)
+            game_state.attempt_spawn("DF", [13, 13])
+            return 0.5
+
+        scheduler = TurnScheduler(0.2, fallback, max_depth=4)
+        scheduler.add_stage("walls", walls, priority=1, max_depth=3)
+        scheduler.add_stage("slow", slow)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            best = scheduler.run(game)
+        self.assertEqual([["FF", 0, 13], ["FF", 1, 13], ["FF", 2, 13]], json.loads(output.getvalue().split("\n")[0]), "The best plan should be submitted")
+        self.assertEqual(3, len(best._build_stack))
+        self.assertEqual([], game._build_stack, "Stages should plan on forks")
+        runs = [(name, depth) for name, depth, _, _ in scheduler.timings]
+        self.assertEqual(["fallback", "walls", "slow", "walls", "slow", "walls"], [name for name, _ in runs][:6])
+        self.assertNotIn(("slow", 4), runs, "Stages expected to overrun the budget should be skipped")
+
+        def stuck(game_state, depth):
+            time.sleep(0.15)
+            return 100
+
+        scheduler = TurnScheduler(0.05, fallback)
+        scheduler.add_stage("stuck", stuck)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            scheduler.run(game)
+            self.assertEqual([["FF", 13, 0]], json.loads(output.getvalue().split("\n")[0]), "The fallback should be submitted when a stage overruns")
+        self.assertEqual(2, len(output.getvalue().strip().split("\n")), "The turn should be submitted exactly once")
+
+        def broken(game_state):
+            game_state.attempt_spawn("FF", [13, 0])
+            raise ValueError("broken fallback")
+
+        scheduler = TurnScheduler(0.2, broken, max_depth=1)
+        scheduler.add_stage("walls", walls)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            best = scheduler.run(game)
+        self.assertEqual([["FF", 0, 13]], json.loads(output.getvalue().split("\n")[0]), "Stages should still run after the fallback raises")
+        self.assertEqual("fallback", scheduler.timings[0][0])
@@ -0,0 +1,122 @@
+import math
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@lru_cache(maxsize=64)
+def _attack_stencil(attack_range):
+    """Gets the (dx, dy) offsets of every location a structure with the given attack range can hit, like GameState.get_attackers
+    """
+    search_radius = math.ceil(attack_range)
+    return tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+        if math.sqrt(dx ** 2 + dy ** 2) <= attack_range)
+
+
+class ThreatMap:
+    """The damage per frame a mobile unit would take at every location from the structures of the other player.
+
+    Get it with game_map.get_threat_map(). It is built once from the structures on the map, then the map updates
+    it whenever a location changes through add_unit, remove_unit, game_map[x, y] = units, an upgrade or a rollback,
+    by removing the old structure's reach and adding the new one's, instead of computing it again.
+    A structure threatens every location within its attackRange, and deals damage_i to mobile units there,
+    so upgrades that change either are included.
+
+    Attributes :
+        * arena_size (int): The size of the arena
+        * damage (tuple): For each player, a flat array of the damage per frame their mobile units would take at every location. Location [x, y] is stored at index x * arena_size + y.
+
+    """
+    def __init__(self, arena_size, tables):
+        self.arena_size = arena_size
+        self._tables = tables
+        num_locations = arena_size * arena_size
+        self.damage = (array('d', bytes(8 * num_locations)), array('d', bytes(8 * num_locations)))
+        self._sources = {}
+        self._views = None
+
+    def copy(self):
+        """Gets an independent copy of this threat map, used when a GameMap is forked
+        """
+        child = ThreatMap(self.arena_size, self._tables)
+        child.damage = (self.damage[0][:], self.damage[1][:])
+        child._sources = dict(self._sources)
+        return child
+
+    def get_damage(self, location, player_index):
+        """Gets the damage per frame a mobile unit of the given player would take at a location
+
+        Args:
+            location: The location of the mobile unit
+            player_index: The player controlling the mobile unit, 0 for you 1 for the enemy
+
+        Returns:
+            The total damage_i of the other player's structures in range of the location
+
+        """
+        x, y = location
+        return self.damage[player_index][int(x) * self.arena_size + int(y)]
+
+    def get_path_damage(self, path, player_index):
+        """Gets the damage a mobile unit would take if it stood one frame on each location of a path, for example from find_path_to_edge
+
+        Args:
+            path: A list of locations
+            player_index: The player controlling the mobile unit, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of the damage per frame at every location of the path
+
+        """
+        damage = self.damage[player_index]
+        size = self.arena_size
+        return sum(damage[int(x) * size + int(y)] for x, y in path)
+
+    def get_layer(self, player_index):
+        """Gets the damage per frame for a player's mobile units at every location.
+        With NumPy installed this is a read only ARENA_SIZE by ARENA_SIZE array indexed [x, y] that stays in sync
+        with the map, like GameMap.get_count_layer. Without NumPy it is the flat array from damage.
+        """
+        if numpy is None:
+            return self.damage[player_index]
+        if self._views is None:
+            views = []
+            for damage in self.damage:
+                view = numpy.frombuffer(damage, dtype=damage.typecode).reshape(self.arena_size, self.arena_size)
+                view.flags.writeable = False
+                views.append(view)
+            self._views = views
+        return self._views[player_index]
+
+    def _refresh_location(self, index, units):
+        """Replaces the threat from the structure that was at index with the threat from the given units
+        """
+        sources = tuple((unit.player_index, unit.attackRange, unit.damage_i) for unit in units
+            if unit.stationary and unit.damage_i > 0 and unit.attackRange > 0 and unit.player_index in (0, 1))
+        old_sources = self._sources.get(index, ())
+        if sources == old_sources:
+            return
+        for player_index, attack_range, damage_i in old_sources:
+            self._add(index, player_index, attack_range, -damage_i)
+        for player_index, attack_range, damage_i in sources:
+            self._add(index, player_index, attack_range, damage_i)
+        if sources:
+            self._sources[index] = sources
+        else:
+            del self._sources[index]
+
+    def _add(self, index, player_index, attack_range, damage_i):
+        size = self.arena_size
+        in_bounds = self._tables.in_bounds
+        # Structures attack the mobile units of the other player
+        damage = self.damage[1 - player_index]
+        x, y = divmod(index, size)
+        for dx, dy in _attack_stencil(attack_range):
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < size and 0 <= ny < size and in_bounds[nx * size + ny]:
+                damage[nx * size + ny] += damage_i
@@ -1,3 +1,8 @@
+from operator import attrgetter
+
+from .unit_catalog import UnitCatalog
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -31,48 +36,57 @@ class GameUnit:
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
 
+    Units only store their location, owner, health, pending_removal and upgraded. Everything else is read from a
+    UnitStats record shared by every unit of the same type, and upgraded units share the upgraded record, so the
+    stats of the unit type are read only.
+
     """
-    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
-        """ Initialize unit variables using args passed
+    __slots__ = ("_stats", "player_index", "x", "y", "health", "pending_removal", "upgraded")
+
+    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1, unit_catalog=None):
+        """ Initialize unit variables using args passed. unit_catalog is the UnitCatalog of config if the caller has it
 
         """
-        self.unit_type = unit_type
-        self.config = config
+        if unit_catalog is None:
+            unit_catalog = UnitCatalog.for_config(config)
+        self._stats = unit_catalog.get_stats(unit_type)
         self.player_index = player_index
         self.pending_removal = False
         self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, FACTORY
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.health = self._stats.max_health if not health else health
+
+    # The stats of the unit type are read from the shared record in the UnitCatalog, upgrade() points the unit to the upgraded record
+    unit_type = property(attrgetter("_stats.unit_type"))
+    config = property(attrgetter("_stats.catalog.config"))
+    stationary = property(attrgetter("_stats.stationary"))
+    speed = property(attrgetter("_stats.speed"))
+    damage_f = property(attrgetter("_stats.damage_f"))
+    damage_i = property(attrgetter("_stats.damage_i"))
+    attackRange = property(attrgetter("_stats.attackRange"))
+    shieldRange = property(attrgetter("_stats.shieldRange"))
+    max_health = property(attrgetter("_stats.max_health"))
+    shieldPerUnit = property(attrgetter("_stats.shieldPerUnit"))
 
+    @property
+    def cost(self):
+        return list(self._stats.cost)
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self._stats = self._stats.catalog.get_stats(self._stats.unit_type, True)
         self.upgraded = True
 
+    def __copy__(self):
+        unit = GameUnit.__new__(GameUnit)
+        unit._stats = self._stats
+        unit.player_index = self.player_index
+        unit.x = self.x
+        unit.y = self.y
+        unit.health = self.health
+        unit.pending_removal = self.pending_removal
+        unit.upgraded = self.upgraded
+        return unit
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -0,0 +1,151 @@
+import weakref
+from collections import namedtuple
+
+
+UnitStats = namedtuple("UnitStats", ["unit_type", "index", "stationary", "speed", "damage_f", "damage_i",
+    "attackRange", "shieldRange", "max_health", "shieldPerUnit", "cost", "catalog"])
+UnitStats.__doc__ = """The stats of a unit type, or of its upgraded version. See GameUnit for what each field means, cost is a tuple (SP, MP).
+Every unit of the type points to the same record, and catalog points back to the UnitCatalog it belongs to."""
+
+
+class UnitCatalog:
+    """Everything the config says about unit types, read once per game instead of every turn and for every unit.
+
+    AlgoCore.on_game_start compiles it, and GameState and GameMap get the same catalog from UnitCatalog.for_config
+    as long as they are given the same config object, and pass it on to the units they create. The catalog is read only,
+    so copy.deepcopy of a game state keeps sharing it. The config should not be changed afterwards.
+
+    Attributes :
+        * config (JSON): The config the catalog was compiled from
+        * WALL, FACTORY, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE (str): The shorthand of each unit type
+        * UNIT_TYPE_TO_INDEX (dict): Maps a unit type to its index in the config's unitInformation
+        * STRUCTURE_TYPES (tuple): The structure unit types
+        * ALL_UNITS (tuple): The unit types that can be spawned
+        * max_attack_range (float): The longest attackRange of any unit type, upgraded or not
+        * get_hit_radius (float): How far outside their range units can be hit from
+
+    """
+    # The catalog of every config still in use, by id of the config. A catalog keeps its config alive, so ids are not reused
+    _compiled = weakref.WeakValueDictionary()
+
+    @classmethod
+    def for_config(cls, config):
+        """Gets the catalog of a config, compiling it only if no catalog of that config is in use
+
+        Args:
+            config (JSON): Contains information about the game
+
+        Returns:
+            The UnitCatalog of the config
+
+        """
+        catalog = cls._compiled.get(id(config))
+        if catalog is None or catalog.config is not config:
+            catalog = cls(config)
+            cls._compiled[id(config)] = catalog
+        return catalog
+
+    def __init__(self, config):
+        """Compiles the unit types of a config
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        unit_information = config["unitInformation"]
+        shorthands = [type_config["shorthand"] for type_config in unit_information]
+        self.WALL, self.FACTORY, self.TURRET, self.SCOUT, self.DEMOLISHER, self.INTERCEPTOR, self.REMOVE, self.UPGRADE = shorthands[:8]
+        self.UNIT_TYPE_TO_INDEX = {unit_type: index for index, unit_type in enumerate(shorthands[:8])}
+        self.STRUCTURE_TYPES = (self.WALL, self.FACTORY, self.TURRET)
+        self.ALL_UNITS = (self.SCOUT, self.DEMOLISHER, self.INTERCEPTOR, self.WALL, self.FACTORY, self.TURRET)
+        self.get_hit_radius = unit_information[0].get("getHitRadius", 0)
+
+        self.__stats = {}
+        self.__upgraded_stats = {}
+        self.__costs = {}
+        self.__upgrade_costs = {}
+        self.__upgradable = set()
+        for unit_type, index in self.UNIT_TYPE_TO_INDEX.items():
+            type_config = unit_information[index]
+            stats = UnitStats(
+                unit_type=unit_type,
+                index=index,
+                stationary=type_config.get("unitCategory") == 0,
+                speed=type_config.get("speed", 0),
+                damage_f=type_config.get("attackDamageTower", 0),
+                damage_i=type_config.get("attackDamageWalker", 0),
+                attackRange=type_config.get("attackRange", 0),
+                shieldRange=type_config.get("shieldRange", 0),
+                max_health=type_config.get("startHealth", 0),
+                shieldPerUnit=type_config.get("shieldPerUnit", 0),
+                cost=(type_config.get("cost1", 0), type_config.get("cost2", 0)),
+                catalog=self)
+            upgrade_config = type_config.get("upgrade")
+            if upgrade_config is not None:
+                self.__upgradable.add(unit_type)
+            else:
+                upgrade_config = {}
+            self.__stats[unit_type] = stats
+            self.__upgraded_stats[unit_type] = stats._replace(
+                speed=upgrade_config.get("speed", stats.speed),
+                damage_f=upgrade_config.get("attackDamageTower", stats.damage_f),
+                damage_i=upgrade_config.get("attackDamageWalker", stats.damage_i),
+                attackRange=upgrade_config.get("attackRange", stats.attackRange),
+                shieldRange=upgrade_config.get("shieldRange", stats.shieldRange),
+                max_health=upgrade_config.get("startHealth", stats.max_health),
+                shieldPerUnit=upgrade_config.get("shieldPerUnit", stats.shieldPerUnit),
+                cost=(upgrade_config.get("cost1", 0) + stats.cost[0], upgrade_config.get("cost2", 0) + stats.cost[1]))
+            self.__costs[unit_type] = list(stats.cost)
+            self.__upgrade_costs[unit_type] = [upgrade_config.get("cost1", stats.cost[0]), upgrade_config.get("cost2", stats.cost[1])]
+
+        self.max_attack_range = max(max(stats.attackRange for stats in self.__stats.values()),
+            max(stats.attackRange for stats in self.__upgraded_stats.values()))
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def get_stats(self, unit_type, upgraded=False):
+        """Gets the stats of a unit type
+
+        Args:
+            unit_type: The units type (string shorthand)
+            upgraded: True to get the stats of the upgraded unit
+
+        Returns:
+            The UnitStats of the unit type, shared by every unit of that type
+
+        """
+        if upgraded:
+            return self.__upgraded_stats[unit_type]
+        return self.__stats[unit_type]
+
+    def is_stationary(self, unit_type):
+        """
+            Args:
+                unit_type: A unit type
+
+            Returns:
+                Boolean, True if the unit is stationary, False otherwise.
+        """
+        return unit_type in self.STRUCTURE_TYPES
+
+    def can_upgrade(self, unit_type):
+        """Whether the config has an upgrade for a unit type
+        """
+        return unit_type in self.__upgradable
+
+    def type_cost(self, unit_type, upgrade=False):
+        """Gets the cost of a unit type, like GameState.type_cost
+
+        Args:
+            unit_type: The units type (string shorthand)
+            upgrade: True to get the cost of upgrading the unit instead
+
+        Returns:
+            The units costs as a list [SP, MP]
+
+        """
+        if upgrade:
+            return list(self.__upgrade_costs[unit_type])
+        return list(self.__costs[unit_type])
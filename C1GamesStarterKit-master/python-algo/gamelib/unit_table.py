@@ -0,0 +1,111 @@
+from array import array
+
+from .util import debug_write
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class UnitTable:
+    """Every unit of a parsed game state in one table, with a column for each attribute instead of a GameUnit per unit.
+
+    GameState builds it while parsing, as game_state.unit_table. Row i of every column describes the same unit,
+    so board-wide questions become array operations instead of loops over game_map[x, y], for example with NumPy:
+
+        table = game_state.unit_table
+        turrets = (table.get_column("type_id") == catalog.UNIT_TYPE_TO_INDEX[TURRET]) & (table.get_column("player_index") == 1)
+        table.get_column("health")[turrets].sum()
+
+    The table is the state as it was parsed: units spawned or removed afterwards through the GameState are not in it.
+    With NumPy, the columns are shared with the arrays from get_column, so the table cannot grow after that.
+
+    Attributes :
+        * unit_types (list): The unit type of each type_id, type ids are the indices in the config's unitInformation
+        * x, y (array): The location of each unit
+        * type_id (array): The type of each unit, see unit_types
+        * player_index (array): The player that controls each unit, 0 for you 1 for the enemy
+        * health (array): The health of each unit
+        * upgraded (array): 1 if the unit is upgraded
+        * pending_removal (array): 1 if the unit is marked for removal by its owner
+        * unit_id (array): The id the engine gave each unit, -1 if it has none
+
+    """
+    COLUMNS = ("x", "y", "type_id", "player_index", "health", "upgraded", "pending_removal", "unit_id")
+
+    def __init__(self, unit_catalog):
+        """Creates an empty table
+
+        Args:
+            unit_catalog (:obj: UnitCatalog): The unit types of the game
+
+        """
+        self.unit_types = list(unit_catalog.UNIT_TYPE_TO_INDEX)
+        self.__type_index = unit_catalog.UNIT_TYPE_TO_INDEX
+        self.x = array('b')
+        self.y = array('b')
+        self.type_id = array('b')
+        self.player_index = array('b')
+        self.health = array('d')
+        self.upgraded = array('b')
+        self.pending_removal = array('b')
+        self.unit_id = array('q')
+        self.__views = {}
+
+    def __len__(self):
+        return len(self.type_id)
+
+    def _append(self, x, y, type_id, player_index, health, unit_id):
+        """Adds a unit to the table while parsing, and returns its row
+        """
+        self.x.append(x)
+        self.y.append(y)
+        self.type_id.append(type_id)
+        self.player_index.append(player_index)
+        self.health.append(health)
+        self.upgraded.append(0)
+        self.pending_removal.append(0)
+        self.unit_id.append(unit_id)
+        return len(self.type_id) - 1
+
+    def get_column(self, name):
+        """Gets a column of the table.
+
+        With NumPy installed this is a read only NumPy array that shares memory with the table, so masks and sums
+        over it need no copying. Without NumPy it is the array itself.
+
+        Args:
+            name: One of UnitTable.COLUMNS
+
+        Returns:
+            The value of that attribute for every unit, in row order
+
+        """
+        if name not in self.COLUMNS:
+            debug_write("No column {} in the unit table, expected one of {}".format(name, self.COLUMNS))
+            return
+        column = getattr(self, name)
+        if numpy is None:
+            return column
+        view = self.__views.get(name)
+        if view is None:
+            view = numpy.frombuffer(column, dtype=column.typecode)
+            view.flags.writeable = False
+            self.__views[name] = view
+        return view
+
+    def select(self, unit_type=None, player_index=None):
+        """Gets the rows of the units matching a type and owner, without NumPy
+
+        Args:
+            unit_type: The type of the units, or None for every type
+            player_index: The player that controls the units, or None for both
+
+        Returns:
+            A list of row indices
+
+        """
+        type_id = None if unit_type is None else self.__type_index.get(unit_type, -1)
+        return [row for row in range(len(self.type_id))
+            if (type_id is None or self.type_id[row] == type_id) and (player_index is None or self.player_index[row] == player_index)]
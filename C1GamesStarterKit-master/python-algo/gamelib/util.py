@@ -1,4 +1,13 @@
+import os
 import sys
+import json
+import select
+from collections import deque
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -21,6 +30,70 @@ def get_command():
         exit()
     return ret
 
+class CommandReader:
+    """Reads the messages from the game engine, and tells how many more are already waiting to be read.
+
+    AlgoCore.start uses it instead of get_command, so it can notice when the engine sends action frames faster than
+    they are handled. Messages are read straight from the file descriptor of the stream, so nothing else should
+    read from the stream once a CommandReader is used. Where the stream has no file descriptor, or select does not
+    work on it (pipes on Windows), the reader falls back to get_command and never sees any waiting messages.
+
+    Attributes :
+        * stream (file): The stream messages are read from, sys.stdin by default
+
+    """
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdin
+        self.__pending = deque()
+        self.__partial = b""
+        self.__eof = False
+        try:
+            self.__fd = self.stream.fileno()
+            select.select([self.__fd], [], [], 0)
+        except (AttributeError, ValueError, OSError):
+            self.__fd = None
+
+    def __feed(self, chunk):
+        if not chunk:
+            self.__eof = True
+            if self.__partial:
+                self.__pending.append(self.__partial.decode("utf-8"))
+                self.__partial = b""
+            return
+        lines = (self.__partial + chunk).split(b"\n")
+        self.__partial = lines.pop()
+        self.__pending.extend(line.decode("utf-8") for line in lines)
+
+    def poll(self):
+        """Reads everything that is already waiting, without blocking
+
+        Returns:
+            The number of complete messages waiting to be read
+
+        """
+        if self.__fd is not None:
+            while not self.__eof and select.select([self.__fd], [], [], 0)[0]:
+                self.__feed(os.read(self.__fd, 1 << 16))
+        return len(self.__pending)
+
+    def peek(self):
+        """Gets the next waiting message without removing it, or None if no message is waiting
+        """
+        return self.__pending[0] if self.__pending else None
+
+    def get_command(self):
+        """Gets the next message, waiting for it if needed, like get_command
+        """
+        if self.__fd is None:
+            return get_command()
+        while not self.__pending:
+            if self.__eof:
+                # Game parent process terminated so exit, like get_command
+                debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+                exit()
+            self.__feed(os.read(self.__fd, 1 << 16))
+        return self.__pending.popleft()
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
@@ -29,6 +102,73 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+_last_parsed = (None, None)
+
+def parse_json(message):
+    """Decodes a json message from the game engine, with orjson if it is installed and the json module otherwise.
+
+    The last message decoded is remembered, so decoding the same string again returns the same object
+    without decoding it twice. That is how AlgoCore.start and GameState share one decode per turn.
+    Treat the result as read only.
+
+    Args:
+        message: A json string
+
+    Returns:
+        The decoded message
+
+    """
+    global _last_parsed
+    last_message, last_result = _last_parsed
+    if message is last_message:
+        return last_result
+    result = orjson.loads(message) if orjson is not None else json.loads(message)
+    _last_parsed = (message, result)
+    return result
+
+_field_decoder = json.JSONDecoder()
+
+def encode_json(value):
+    """Encodes a value as json, and remembers it like parse_json does, so decoding the result again is free
+
+    Args:
+        value: The value to encode
+
+    Returns:
+        The json string
+
+    """
+    global _last_parsed
+    message = json.dumps(value)
+    _last_parsed = (message, value)
+    return message
+
+def parse_json_field(message, key):
+    """Decodes only the value of one top level key of a json message from the game engine, like parse_json(message)[key].
+
+    The value is found by searching for the key, so this is much cheaper than decoding the whole message when the
+    value is small, for example "turnInfo" or "events" of an action frame. The key must not appear anywhere else in
+    the message. If the message was just decoded by parse_json, the value is read from that instead.
+
+    Args:
+        message: A json string
+        key: A top level key of the message
+
+    Returns:
+        The decoded value, or None if the message does not have the key
+
+    """
+    last_message, last_result = _last_parsed
+    if message is last_message:
+        return last_result.get(key)
+    start = message.find('"{}"'.format(key))
+    if start < 0:
+        return None
+    start = message.index(':', start + len(key) + 2) + 1
+    while message[start] in ' \t\r\n':
+        start += 1
+    return _field_decoder.raw_decode(message, start)[0]
+
 def debug_write(*msg):
     """Prints a message to the games debug output
 
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a python script to check pathfinding implementations against each other and measure
+how many paths per second they find. Run it before landing any change to gamelib/navigation.py.
+It also speaks the same protocol as rust-algo/pathtest, so both can be checked against each other.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the scripts/contributions directory, and uses the gamelib
+package from the python-algo directory.
+
+There are two ways to run it.
+
+1st:
+>py scripts/contributions/pathtest.py -r 200
+
+This generates 200 random boards (scattered walls, walled off rows and closed pockets so units
+have to self destruct) and paths from random start locations to random edges on each of them.
+Every implementation answers the same queries, and the script prints the paths per second of
+each one and every path that differs from the first implementation, which is the reference.
+The reference is a copy of the original node and queue search of gamelib, kept in this file so
+changes to gamelib/navigation.py are always checked against the behaviour they must preserve.
+
+Use -i to pick the implementations, -q for the number of queries per board and --seed to
+repeat a run. -c adds an external program that speaks the pathtest protocol, for example:
+>py scripts/contributions/pathtest.py -r 50 -c rust-algo/target/release/pathtest
+
+2nd:
+>py scripts/contributions/pathtest.py -s
+
+This speaks the pathtest protocol on stdin and stdout, answering with gamelib.
+The first line is the game config. Then for each query there is a game state line (states that
+are not from the deploy phase are skipped), a line with the start location as [x, y] and a line
+with the target edge as an integer (0 top right, 1 top left, 2 bottom left, 3 bottom right).
+The path is printed as a JSON list of [x, y] locations, or null if the start location is blocked.
+'''
+
+import sys
+try:
+	import os
+	import json
+	import time
+	import queue
+	import random
+	import argparse
+	import subprocess
+except ImportError as e:
+	print("WARNING: Module not found, full error:\n")
+	print(str(e))
+	sys.exit()
+
+file_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.abspath(os.path.join(file_dir, os.pardir, os.pardir))
+sys.path.insert(0, os.path.join(repo_dir, 'python-algo'))
+
+import gamelib
+from gamelib import navigation
+
+ARENA_SIZE = 28
+HALF_ARENA = 14
+
+# A deploy phase game state with the given walls, p1 owns the bottom half of the board and p2 the top half
+def make_state(walls):
+	p1_walls = []
+	p2_walls = []
+	for i, (x, y) in enumerate(walls):
+		unit = [x, y, 60.0, str(i)]
+		if y < HALF_ARENA:
+			p1_walls.append(unit)
+		else:
+			p2_walls.append(unit)
+	state = {
+		"turnInfo": [0, 1, -1],
+		"p1Stats": [30.0, 40.0, 5.0, 0],
+		"p2Stats": [30.0, 40.0, 5.0, 0],
+		"p1Units": [p1_walls, [], [], [], [], [], [], []],
+		"p2Units": [p2_walls, [], [], [], [], [], [], []],
+		"events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [], "spawn": [], "death": [], "attack": [], "melee": []}
+	}
+	return json.dumps(state)
+
+def arena_locations():
+	return [[x, y] for x in range(ARENA_SIZE) for y in range(ARENA_SIZE)
+		if HALF_ARENA - 1 <= x + y <= 3 * HALF_ARENA - 1 and abs(x - y) <= HALF_ARENA]
+
+# Rows of walls with a few gaps, so units have to weave between them
+def wall_rows(rng, locations):
+	walls = set()
+	for y in rng.sample(range(2, ARENA_SIZE - 2), rng.randint(2, 6)):
+		row = [location for location in locations if location[1] == y]
+		gaps = rng.sample(row, min(len(row), rng.randint(1, 3)))
+		walls.update(tuple(location) for location in row if location not in gaps)
+	return walls
+
+# A closed ring of walls, so units inside it have to self destruct
+def closed_pocket(rng, locations):
+	cx = rng.randint(6, 21)
+	cy = rng.randint(6, 21)
+	radius = rng.randint(1, 4)
+	return set(tuple(location) for location in locations if abs(location[0] - cx) + abs(location[1] - cy) == radius)
+
+def random_board(rng, locations):
+	style = rng.choice(['scatter', 'rows', 'pockets', 'closed'])
+	walls = set()
+	if style == 'rows':
+		walls = wall_rows(rng, locations)
+	elif style == 'pockets':
+		for _ in range(rng.randint(1, 4)):
+			walls |= closed_pocket(rng, locations)
+	elif style == 'closed':
+		# Wall off a whole row, so nobody on one side can reach the other
+		y = rng.randint(3, ARENA_SIZE - 4)
+		walls = set(tuple(location) for location in locations if location[1] == y)
+	density = rng.uniform(0.0, 0.45) if style == 'scatter' else rng.uniform(0.0, 0.15)
+	walls.update(tuple(location) for location in locations if rng.random() < density)
+	return sorted(walls)
+
+def random_queries(rng, locations, walls, count):
+	open_locations = [location for location in locations if tuple(location) not in walls]
+	return [(rng.choice(open_locations), rng.randint(0, 3)) for _ in range(count)]
+
+# Each implementation gets a fresh GameState for a board and returns the path of every query
+def make_game_state(config, state):
+	game_state = gamelib.GameState(config, state)
+	game_state.suppress_warnings(True)
+	return game_state
+
+# The original gamelib pathfinder, one Node per location and a breadth first search per path, without caching
+class Node:
+	def __init__(self):
+		self.visited_idealness = False
+		self.visited_validate = False
+		self.blocked = False
+		self.pathlength = -1
+
+class BaselinePathFinder:
+	HORIZONTAL = 1
+	VERTICAL = 2
+
+	def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+		if game_state.contains_stationary_unit(start_point):
+			return
+		self.game_state = game_state
+		self.game_map = [[Node() for x in range(game_state.ARENA_SIZE)] for y in range(game_state.ARENA_SIZE)]
+		for location in game_state.game_map:
+			if game_state.contains_stationary_unit(location):
+				self.game_map[location[0]][location[1]].blocked = True
+		ideal_endpoints = self._idealness_search(start_point, end_points)
+		self._validate(ideal_endpoints, end_points)
+		return self._get_path(start_point, end_points)
+
+	def _is_open(self, location):
+		return self.game_state.game_map.in_arena_bounds(location) and not self.game_map[location[0]][location[1]].blocked
+
+	def _idealness_search(self, start, end_points):
+		current = queue.Queue()
+		current.put(start)
+		best_idealness = self._get_idealness(start, end_points)
+		self.game_map[start[0]][start[1]].visited_idealness = True
+		most_ideal = start
+		while not current.empty():
+			search_location = current.get()
+			for neighbor in self._get_neighbors(search_location):
+				if not self._is_open(neighbor):
+					continue
+				x, y = neighbor
+				current_idealness = self._get_idealness(neighbor, end_points)
+				if current_idealness > best_idealness:
+					best_idealness = current_idealness
+					most_ideal = neighbor
+				if not self.game_map[x][y].visited_idealness:
+					self.game_map[x][y].visited_idealness = True
+					current.put(neighbor)
+		return most_ideal
+
+	def _get_neighbors(self, location):
+		x, y = location
+		return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+
+	def _get_direction_from_endpoints(self, end_points):
+		x, y = end_points[0]
+		direction = [1, 1]
+		if x < self.game_state.HALF_ARENA:
+			direction[0] = -1
+		if y < self.game_state.HALF_ARENA:
+			direction[1] = -1
+		return direction
+
+	def _get_idealness(self, location, end_points):
+		if location in end_points:
+			return sys.maxsize
+		direction = self._get_direction_from_endpoints(end_points)
+		idealness = 28 * location[1] if direction[1] == 1 else 28 * (27 - location[1])
+		idealness += location[0] if direction[0] == 1 else 27 - location[0]
+		return idealness
+
+	def _validate(self, ideal_tile, end_points):
+		current = queue.Queue()
+		starts = end_points if ideal_tile in end_points else [ideal_tile]
+		for location in starts:
+			current.put(location)
+			self.game_map[location[0]][location[1]].pathlength = 0
+			self.game_map[location[0]][location[1]].visited_validate = True
+		while not current.empty():
+			current_location = current.get()
+			current_node = self.game_map[current_location[0]][current_location[1]]
+			for neighbor in self._get_neighbors(current_location):
+				if not self._is_open(neighbor):
+					continue
+				neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
+				if not neighbor_node.visited_validate and not current_node.blocked:
+					neighbor_node.pathlength = current_node.pathlength + 1
+					neighbor_node.visited_validate = True
+					current.put(neighbor)
+
+	def _get_path(self, start_point, end_points):
+		path = [start_point]
+		current = start_point
+		move_direction = 0
+		while not self.game_map[current[0]][current[1]].pathlength == 0:
+			next_move = self._choose_next_move(current, move_direction, end_points)
+			move_direction = self.VERTICAL if current[0] == next_move[0] else self.HORIZONTAL
+			path.append(next_move)
+			current = next_move
+		return path
+
+	def _choose_next_move(self, current_point, previous_move_direction, end_points):
+		ideal_neighbor = current_point
+		best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
+		for neighbor in self._get_neighbors(current_point):
+			if not self._is_open(neighbor):
+				continue
+			current_pathlength = self.game_map[neighbor[0]][neighbor[1]].pathlength
+			if current_pathlength > best_pathlength:
+				continue
+			if current_pathlength == best_pathlength and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+				continue
+			ideal_neighbor = neighbor
+			best_pathlength = current_pathlength
+		return ideal_neighbor
+
+	def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+		if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
+			return prev_tile[1] != new_tile[1]
+		if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
+			return prev_tile[0] != new_tile[0]
+		if previous_move_direction == 0:
+			return prev_tile[1] != new_tile[1]
+		direction = self._get_direction_from_endpoints(end_points)
+		if new_tile[1] == prev_best[1]:
+			return (direction[0] == 1 and new_tile[0] > prev_best[0]) or (direction[0] == -1 and new_tile[0] < prev_best[0])
+		if new_tile[0] == prev_best[0]:
+			return (direction[1] == 1 and new_tile[1] > prev_best[1]) or (direction[1] == -1 and new_tile[1] < prev_best[1])
+		return True
+
+def reference_paths(config, state, queries):
+	game_state = make_game_state(config, state)
+	finder = BaselinePathFinder()
+	return [finder.navigate_multiple_endpoints(start, game_state.game_map.get_edge_locations(edge), game_state) for start, edge in queries]
+
+def single_paths(config, state, queries):
+	game_state = make_game_state(config, state)
+	game_state._shortest_path_finder.use_numpy = False
+	return [game_state.find_path_to_edge(start, edge) for start, edge in queries]
+
+# Computes the distance fields of all four edges in one NumPy sweep, then reads the paths from them
+def numpy_paths(config, state, queries):
+	game_state = make_game_state(config, state)
+	game_state.get_distance_fields(range(4))
+	return [game_state.find_path_to_edge(start, edge) for start, edge in queries]
+
+def batch_paths(config, state, queries):
+	game_state = make_game_state(config, state)
+	game_state._shortest_path_finder.use_numpy = False
+	paths = [None] * len(queries)
+	for edge in range(4):
+		indices = [i for i, query in enumerate(queries) if query[1] == edge]
+		edge_paths = game_state.find_paths_to_edge_batch([queries[i][0] for i in indices], edge)
+		for i, path in zip(indices, edge_paths):
+			paths[i] = path
+	return paths
+
+def bitboard_paths(config, state, queries):
+	game_state = make_game_state(config, state)
+	game_state._shortest_path_finder = navigation.BitboardPathFinder()
+	return [game_state.find_path_to_edge(start, edge) for start, edge in queries]
+
+IMPLEMENTATIONS = {
+	'reference': reference_paths,
+	'single': single_paths,
+	'batch': batch_paths,
+	'bitboard': bitboard_paths,
+}
+if navigation.numpy is not None:
+	IMPLEMENTATIONS['numpy'] = numpy_paths
+
+# Runs an external program that speaks the pathtest protocol, keeping it alive between boards
+class ProtocolProcess:
+	def __init__(self, command, config):
+		self.process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+		self.process.stdin.write(json.dumps(config) + '\n')
+
+	def __call__(self, config, state, queries):
+		paths = []
+		for start, edge in queries:
+			self.process.stdin.write('{}\n{}\n{}\n'.format(state, json.dumps(start), edge))
+			self.process.stdin.flush()
+			line = self.process.stdout.readline()
+			if not line:
+				raise RuntimeError('Pathtest program exited')
+			paths.append(json.loads(line))
+		return paths
+
+	def close(self):
+		self.process.stdin.close()
+		self.process.wait()
+
+def cross_validate(config, names, command, rounds, queries_per_board, seed):
+	rng = random.Random(seed)
+	locations = arena_locations()
+	implementations = [(name, IMPLEMENTATIONS[name]) for name in names]
+	external = None
+	if command:
+		external = ProtocolProcess(command, config)
+		implementations.append((command, external))
+
+	times = {name: 0.0 for name, _ in implementations}
+	mismatches = {name: [] for name, _ in implementations}
+	num_paths = 0
+	for board in range(rounds):
+		walls = random_board(rng, locations)
+		state = make_state(walls)
+		queries = random_queries(rng, locations, set(walls), queries_per_board)
+		expected = None
+		for name, find_paths in implementations:
+			start_time = time.perf_counter()
+			paths = find_paths(config, state, queries)
+			times[name] += time.perf_counter() - start_time
+			if expected is None:
+				expected = paths
+				continue
+			for (start, edge), path, expected_path in zip(queries, paths, expected):
+				if path != expected_path:
+					mismatches[name].append((board, start, edge, expected_path, path))
+		num_paths += len(queries)
+
+	if external is not None:
+		external.close()
+
+	print('{} boards, {} paths each, seed {}\n'.format(rounds, queries_per_board, seed))
+	print('{: <30}{: >15}{: >15}'.format('implementation', 'paths/second', 'mismatches'))
+	for name, _ in implementations:
+		print('{: <30}{: >15.0f}{: >15}'.format(name, num_paths / max(times[name], 1e-9), len(mismatches[name])))
+	for name, _ in implementations:
+		for board, start, edge, expected_path, path in mismatches[name][:5]:
+			print('\n{} differs on board {} from {} to edge {}:\n\texpected {}\n\tgot      {}'.format(name, board, start, edge, expected_path, path))
+	return sum(len(found) for found in mismatches.values())
+
+def serve():
+	config = json.loads(sys.stdin.readline())
+	while True:
+		line = sys.stdin.readline()
+		if not line:
+			break
+		state = json.loads(line)
+		if int(state["turnInfo"][0]) != 0:
+			continue
+		start = [int(float(v)) for v in json.loads(sys.stdin.readline())]
+		edge = int(float(sys.stdin.readline()))
+		game_state = make_game_state(config, line)
+		path = game_state.find_path_to_edge(start, edge)
+		sys.stdout.write(json.dumps(path) + '\n')
+		sys.stdout.flush()
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		"-s", "--serve",
+		action='store_true',
+		help="speak the pathtest protocol on stdin and stdout\n\n")
+	ap.add_argument(
+		"-r", "--rounds",
+		type=int,
+		default=0,
+		help="number of random boards to check the implementations on\n\n")
+	ap.add_argument(
+		"-q", "--queries",
+		type=int,
+		default=20,
+		help="number of paths to find on each board\n\n")
+	ap.add_argument(
+		"-i", "--implementations",
+		nargs='*',
+		default=list(IMPLEMENTATIONS),
+		choices=list(IMPLEMENTATIONS),
+		help="implementations to check, the first one is the reference\n\n")
+	ap.add_argument(
+		"-c", "--command",
+		default='',
+		help="an external program that speaks the pathtest protocol, checked against the reference\n\n")
+	ap.add_argument(
+		"--config",
+		default=os.path.join(repo_dir, 'game-configs.json'),
+		help="game config to use for random boards\n\n")
+	ap.add_argument(
+		"--seed",
+		type=int,
+		default=0,
+		help="seed for the random boards\n\n")
+	return vars(ap.parse_args())
+
+if __name__ == '__main__':
+	args = parse_args() # get command line arguments
+
+	if args['serve']:
+		serve()
+	elif args['rounds'] > 0:
+		with open(args['config']) as f:
+			config = json.load(f)
+		found = cross_validate(config, args['implementations'], args['command'], args['rounds'], args['queries'], args['seed'])
+		sys.exit(1 if found else 0)
+	else:
+		print ('No arguments - no action taken')
+		sys.exit()